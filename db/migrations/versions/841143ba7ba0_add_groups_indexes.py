@@ -0,0 +1,23 @@
+"""add groups index
+
+Revision ID: 841143ba7ba0
+Revises: a3c51e7d9b02
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '841143ba7ba0'
+down_revision = 'a3c51e7d9b02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_switches_groups', 'switches', ['groups'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('idx_switches_groups', table_name='switches')
@@ -0,0 +1,26 @@
+"""notify switch changes
+
+Revision ID: a3c51e7d9b02
+Revises: f3cd679c723f
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+from its_on.models import NOTIFY_SWITCH_CHANGE_FUNCTION, NOTIFY_SWITCH_CHANGE_TRIGGER
+
+# revision identifiers, used by Alembic.
+revision = 'a3c51e7d9b02'
+down_revision = 'f3cd679c723f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(NOTIFY_SWITCH_CHANGE_FUNCTION)
+    op.execute(NOTIFY_SWITCH_CHANGE_TRIGGER)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS switches_notify_change ON switches')
+    op.execute('DROP FUNCTION IF EXISTS notify_switch_change()')
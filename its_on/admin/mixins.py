@@ -1,29 +1,82 @@
-from typing import Dict, Union, Optional
+import contextlib
+from typing import AsyncContextManager, Dict, Union, Optional
 
+from aiopg.sa import SAConnection
 from sqlalchemy.engine import ResultProxy
 from sqlalchemy import Table
-from aiohttp.web import Request
+from sqlalchemy.sql import ColumnElement
+from aiohttp.web import AppKey, Request
 
-from its_on.app_keys import db_key
+from its_on.app_keys import db_key, negative_cache_key
+from its_on.cache import make_negative_cache_key
+from its_on.change_feed import publishing_switch_changes
 from marshmallow import Schema
 from multidict import MultiDictProxy, MultiDict
 
 
-class GetObjectMixin:
+class TrackChangesMixin:
+    def track_changes(
+        self, request: Request, conn: SAConnection, condition: ColumnElement,
+    ) -> AsyncContextManager[None]:
+        """Context of a write to the objects matching `condition`, nothing is tracked by default."""
+        return contextlib.nullcontext()
+
+
+class SwitchChangesMixin(TrackChangesMixin):
+    """Publishes admin writes to switches, so every worker evicts the affected groups."""
+
+    def track_changes(
+        self, request: Request, conn: SAConnection, condition: ColumnElement,
+    ) -> AsyncContextManager[None]:
+        return publishing_switch_changes(request, conn, condition)
+
+
+class GetObjectMixin(TrackChangesMixin):
     model: Table
+    # Ids that are not found are remembered in the negative cache under this namespace, if it is set.
+    missing_objects_namespace: Optional[str] = None
 
     async def get_object_pk(self, request: Request) -> Optional[str]:
         return request.match_info.get('id')
 
     async def get_object(self, request: Request) -> ResultProxy:
+        object_id = await self.get_object_pk(request)
+        if self.missing_objects_namespace is None:
+            return await self.load_object(request, object_id)
+
+        negative_cache = request.app[negative_cache_key]
+        key = make_negative_cache_key(self.missing_objects_namespace, object_id)
+        if negative_cache.get(key):
+            return None
+
+        model_object = await self.load_object(request, object_id)
+        if model_object is None:
+            negative_cache.set(key, True)
+        return model_object
+
+    async def load_object(self, request: Request, object_id: Optional[str]) -> ResultProxy:
         async with request.app[db_key].acquire() as conn:
-            object_id = await self.get_object_pk(request)
             query = self.model.select().where(self.model.c.id == object_id)
 
             result = await conn.execute(query)
             return await result.fetchone()
 
 
+class BatchGetObjectMixin(GetObjectMixin):
+    """Looks objects up through the batching loader of the worker.
+
+    Concurrent requests share one query, but the object may be up to the loader cache TTL old,
+    so views that change objects keep using `GetObjectMixin`.
+    """
+
+    loader_key: AppKey
+
+    async def load_object(self, request: Request, object_id: Optional[str]) -> ResultProxy:
+        if object_id is None or not object_id.isdigit():
+            return None
+        return await request.app[self.loader_key].load(int(object_id))
+
+
 class UpdateMixin(GetObjectMixin):
     model: Table
     validator: Schema
@@ -36,15 +89,17 @@ class UpdateMixin(GetObjectMixin):
     async def _update(self, request: Request, to_update: Dict[str, Union[str, bool, int]]) -> None:
         async with request.app[db_key].acquire() as conn:
             object_pk = await self.get_object_pk(request)
-            update_query = self.model.update().where(self.model.c.id == object_pk).values(to_update)
+            condition = self.model.c.id == object_pk
+            update_query = self.model.update().where(condition).values(to_update)
 
-            await conn.execute(update_query)
+            async with self.track_changes(request, conn, condition):
+                await conn.execute(update_query)
 
     def _validate_form_data(self, to_validate: Union[MultiDictProxy, MultiDict]) -> Dict[str, Union[int, str, bool]]:
         return self.validator.load(to_validate)
 
 
-class CreateMixin:
+class CreateMixin(TrackChangesMixin):
     model: Table
     validator: Schema
 
@@ -57,7 +112,8 @@ class CreateMixin:
         async with request.app[db_key].acquire() as conn:
             create_query = self.model.insert().values(to_create)
 
-            await conn.execute(create_query)
+            async with self.track_changes(request, conn, self.model.c.name == to_create['name']):
+                await conn.execute(create_query)
 
     def _validate_form_data(self, to_validate: MultiDictProxy) -> Dict[str, Union[int, str, bool]]:
         return self.validator.load(to_validate)
@@ -13,7 +13,8 @@ from sqlalchemy.sql import Select
 
 from auth.decorators import login_required
 from its_on.app_keys import db_key
-from its_on.admin.mixins import CreateMixin, GetObjectMixin, UpdateMixin
+from its_on.change_feed import publishing_switch_changes
+from its_on.admin.mixins import CreateMixin, GetObjectMixin, SwitchChangesMixin, UpdateMixin
 from its_on.admin.permissions import CanEditSwitch
 from its_on.admin.schemes import (
     SwitchAddAdminPostRequestSchema,
@@ -28,6 +29,7 @@ from its_on.admin.utils import (
 )
 from its_on.models import switches
 from its_on.schemes import RemoteSwitchesDataSchema
+from its_on.upstream import fetch_switches_full_info
 from its_on.utils import get_switch_badge_svg, get_switch_markdown_badge, utc_now
 
 
@@ -78,7 +80,7 @@ class SwitchListAdminView(web.View):
     def filter_group(self, qs: Select, request_params: Dict[str, Any]) -> Select:
         group = request_params.get('group')
         if group:
-            qs = qs.where(switches.c.groups.any(group))
+            qs = qs.where(switches.c.groups.contains([group]))
         return qs
 
     def filter_queryset(self, qs: Select, request_params: Dict[str, Any]) -> Select:
@@ -87,7 +89,7 @@ class SwitchListAdminView(web.View):
         return self.order_queryset(qs, request_params)
 
 
-class SwitchDetailAdminView(web.View, UpdateMixin):
+class SwitchDetailAdminView(web.View, SwitchChangesMixin, UpdateMixin):
     validator = SwitchDetailAdminPostRequestSchema()
     permissions = [CanEditSwitch]
     model = switches
@@ -150,7 +152,7 @@ class SwitchDetailAdminView(web.View, UpdateMixin):
                 raise web.HTTPForbidden
 
 
-class SwitchAddAdminView(web.View, CreateMixin):
+class SwitchAddAdminView(web.View, SwitchChangesMixin, CreateMixin):
     validator = SwitchAddAdminPostRequestSchema()
     model = switches
 
@@ -177,10 +179,10 @@ class SwitchAddAdminView(web.View, CreateMixin):
                 except ValidationError as error:
                     return await self.get_context_data(errors=error, user_input=dict(form_data))
                 form_data['deleted_at'] = None  # type: ignore
-                update_query = self.model.update().where(
-                    self.model.c.id == str(already_created_switch.id),
-                ).values(form_data)
-                await conn.execute(update_query)
+                condition = self.model.c.id == str(already_created_switch.id)
+                update_query = self.model.update().where(condition).values(form_data)
+                async with self.track_changes(self.request, conn, condition):
+                    await conn.execute(update_query)
 
                 new_value = str(form_data.get('is_active'))
                 await save_switch_history(self.request, already_created_switch, new_value)
@@ -212,32 +214,38 @@ class SwitchAddAdminView(web.View, CreateMixin):
 
 
 class SwitchesCopyAdminView(web.View, CreateMixin):
+    """Copies switches from another its_on instance.
+
+    The copied switches are published as one change after the last write,
+    not switch by switch: every worker reloads its caches once per copy.
+    """
+
     validator = SwitchCopyFromAnotherItsOnAdminPostRequestSchema()
     remote_validator = RemoteSwitchesDataSchema()
     model = switches
 
     @staticmethod
-    async def _get_switches_data() -> MultiDictProxy:
+    async def _get_switches_data() -> Dict[str, Any]:
         async with ClientSession() as session:
-            async with session.get(settings.SYNC_FROM_ITS_ON_URL) as resp:
-                resp.raise_for_status()
-                return await resp.json()
+            result = await fetch_switches_full_info(
+                session, settings.SYNC_FROM_ITS_ON_URL, settings.SYNC_FROM_ITS_ON_PAGE_SIZE,
+            )
+        return {'result': result}
 
     @aiohttp_jinja2.template('switches/error.html')
     @login_required
     async def post(self) -> Dict[str, Exception]:
         update_existing = bool(self.request.rel_url.query.get('update_existing'))
         try:
-            switches_data = await self._get_switches_data()
-        except (ClientConnectionError, ClientResponseError) as error:
-            return {'errors': error}
-        try:
-            switches_data = self.remote_validator.load(switches_data)
-        except ValidationError as error:
+            switches_data = self.remote_validator.load(await self._get_switches_data())
+        except (ClientConnectionError, ClientResponseError, ValidationError) as error:
             return {'errors': error}
 
-        for switch_data in switches_data['result']:
-            await self._create_or_update_switch(switch_data, update_existing)
+        names = [str(switch_data['name']).strip() for switch_data in switches_data['result']]
+        async with self.request.app[db_key].acquire() as conn:
+            async with publishing_switch_changes(self.request, conn, self.model.c.name.in_(names)):
+                for switch_data in switches_data['result']:
+                    await self._create_or_update_switch(switch_data, update_existing)
 
         location = self.request.app.router['switches_list'].url_for()
         raise web.HTTPFound(location=location)
@@ -254,18 +262,15 @@ class SwitchesCopyAdminView(web.View, CreateMixin):
     async def _update_switch(self, switch_data: MultiDictProxy) -> None:
         switch_data.pop('updated_at')  # type: ignore
         async with self.request.app[db_key].acquire() as conn:
-            update_query = (
-                self.model.update()
-                .where(self.model.c.name == switch_data['name'])
-                .values(switch_data)
-            )
+            condition = self.model.c.name == switch_data['name']
+            update_query = self.model.update().where(condition).values(switch_data)
             try:
                 await conn.execute(update_query)
             except (ValidationError, psycopg2.IntegrityError):
                 pass
 
 
-class SwitchDeleteAdminView(web.View, GetObjectMixin):
+class SwitchDeleteAdminView(web.View, SwitchChangesMixin, GetObjectMixin):
     model = switches
 
     @login_required
@@ -273,9 +278,11 @@ class SwitchDeleteAdminView(web.View, GetObjectMixin):
         async with self.request.app[db_key].acquire() as conn:
             object_pk = await self.get_object_pk(self.request)
             model_object = await self.get_object(self.request)
-            update_query = self.model.update().where(self.model.c.id == object_pk).values(
+            condition = self.model.c.id == object_pk
+            update_query = self.model.update().where(condition).values(
                 {'deleted_at': utc_now() + datetime.timedelta(days=model_object.ttl)})
 
-            await conn.execute(update_query)
+            async with self.track_changes(self.request, conn, condition):
+                await conn.execute(update_query)
         location = self.request.app.router['switches_list'].url_for()
         raise web.HTTPFound(location=location)
@@ -3,3 +3,18 @@ from aiohttp.web import AppKey
 db_key: AppKey = AppKey('db')
 config_key: AppKey = AppKey('config')
 cache_key: AppKey = AppKey('cache')
+snapshot_key: AppKey = AppKey('snapshot')
+switch_change_feed_key: AppKey = AppKey('switch_change_feed')
+switch_change_listener_key: AppKey = AppKey('switch_change_listener')
+switch_watch_hub_key: AppKey = AppKey('switch_watch_hub')
+switch_events_key: AppKey = AppKey('switch_events')
+switch_list_cache_key: AppKey = AppKey('switch_list_cache')
+switch_full_list_cache_key: AppKey = AppKey('switch_full_list_cache')
+svg_badge_cache_key: AppKey = AppKey('svg_badge_cache')
+svg_board_cache_key: AppKey = AppKey('svg_board_cache')
+switch_loader_key: AppKey = AppKey('switch_loader')
+replica_key: AppKey = AppKey('replica')
+redis_key: AppKey = AppKey('redis')
+redis_change_listener_key: AppKey = AppKey('redis_change_listener')
+group_switches_cache_key: AppKey = AppKey('group_switches_cache')
+negative_cache_key: AppKey = AppKey('negative_cache')
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import functools
+from typing import Iterable, Optional
+
+from aiohttp import web
+from aiopg.sa.result import RowProxy
+
+from its_on.app_keys import config_key, svg_badge_cache_key, svg_board_cache_key, switch_change_feed_key
+from its_on.cache import LRUCache
+from its_on.change_feed import SwitchChange
+from its_on.constants import SWITCH_NOT_FOUND_SVG_BADGE_PREFIX
+from its_on.payloads import EncodedBody
+from its_on.utils import get_badge_svg, get_switch_badge_prefix_and_value, make_badge
+
+SVG_BADGE_CACHE_NAMESPACE = 'svg_badge'
+SVG_BOARD_CACHE_NAMESPACE = 'svg_board'
+
+BOARD_ROW_HEIGHT = 24  # anybadge badges are 20px high
+
+
+def make_svg_badge_cache_key(hostname: str, prefix: str, value: str) -> str:
+    return f'{SVG_BADGE_CACHE_NAMESPACE}:{hostname}:{prefix}:{value}'
+
+
+def svg_board_cache_namespace(group_name: str) -> str:
+    return f'{SVG_BOARD_CACHE_NAMESPACE}:{group_name}'
+
+
+def make_svg_board_cache_key(group_name: str, hostname: str, version: Optional[int]) -> str:
+    return f'{svg_board_cache_namespace(group_name)}:{hostname}:{version}'
+
+
+def get_switch_badge(cache: LRUCache, hostname: str, switch: Optional[RowProxy]) -> EncodedBody:
+    """Rendered SVG badge of the switch, anybadge only runs on a cache miss."""
+    prefix, value = get_switch_badge_prefix_and_value(switch)
+    key = make_svg_badge_cache_key(hostname, prefix, value)
+
+    badge = cache.get(key)
+    if badge is None:
+        badge = EncodedBody(get_badge_svg(hostname, prefix, value).encode())
+        cache.set(key, badge)
+    return badge
+
+
+def get_group_board_svg(hostname: str, switches: Iterable[RowProxy]) -> str:
+    """One SVG with the badges of the switches stacked top to bottom."""
+    badges = [make_badge(hostname, *get_switch_badge_prefix_and_value(switch)) for switch in switches]
+    if not badges:
+        badges = [make_badge(hostname, SWITCH_NOT_FOUND_SVG_BADGE_PREFIX, 'no flags')]
+
+    width = max(badge.badge_width for badge in badges)
+    height = BOARD_ROW_HEIGHT * len(badges)
+    # Every badge gets its own mask id from anybadge, so they do not clash inside one document.
+    rows = ''.join(
+        f'<g transform="translate(0 {BOARD_ROW_HEIGHT * row})">{_strip_xml_declaration(badge.badge_svg_text)}</g>'
+        for row, badge in enumerate(badges)
+    )
+    return f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">{rows}</svg>'
+
+
+def _strip_xml_declaration(svg: str) -> str:
+    return svg[svg.index('?>') + 2:] if svg.startswith('<?xml') else svg
+
+
+async def invalidate_svg_badge_cache(cache: LRUCache, change: SwitchChange) -> None:
+    # Badges are keyed by what they show, not by switch id, so the whole namespace goes.
+    cache.clear(SVG_BADGE_CACHE_NAMESPACE)
+
+
+async def invalidate_svg_board_cache(cache: LRUCache, change: SwitchChange) -> None:
+    if change.groups is None:
+        cache.clear(SVG_BOARD_CACHE_NAMESPACE)
+        return
+
+    for group_name in change.groups:
+        cache.clear(svg_board_cache_namespace(group_name))
+
+
+def setup_svg_badge_cache(app: web.Application) -> None:
+    config = app[config_key]
+    badge_cache = LRUCache(max_size=config.FLAG_SVG_BADGE.CACHE_MAX_SIZE, ttl=config.FLAG_SVG_BADGE.CACHE_TTL)
+    app[svg_badge_cache_key] = badge_cache
+    app[switch_change_feed_key].subscribe(functools.partial(invalidate_svg_badge_cache, badge_cache))
+
+    # Boards leave out switches once their deletion time passes, so they expire like the switch lists.
+    board_cache = LRUCache(max_size=config.FLAG_SVG_BADGE.BOARD_CACHE_MAX_SIZE, ttl=config.CACHE_TTL)
+    app[svg_board_cache_key] = board_cache
+    app[switch_change_feed_key].subscribe(functools.partial(invalidate_svg_board_cache, board_cache))
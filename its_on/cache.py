@@ -1,15 +1,441 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
 from urllib.parse import urlparse
 
 from aiocache import Cache
+from aiocache.base import BaseCache
 from aiocache.serializers import JsonSerializer
 from aiohttp import web
-from typing import Callable
 
-from its_on.app_keys import cache_key, config_key
+from its_on.app_keys import (
+    cache_key,
+    config_key,
+    negative_cache_key,
+    snapshot_key,
+    switch_change_feed_key,
+    switch_full_list_cache_key,
+    switch_list_cache_key,
+)
+from its_on.change_feed import SwitchChange
+from its_on.payloads import CachedPayload
+
+logger = logging.getLogger(__name__)
+
+SWITCH_LIST_CACHE_NAMESPACE = 'switch_list'
+SWITCH_FULL_LIST_CACHE_NAMESPACE = 'switch_full_list'
+MISSING_GROUP_NAMESPACE = 'missing_group'
+MISSING_SWITCH_NAMESPACE = 'missing_switch'
+GENERATION_NAMESPACE = 'generation'
+DATABASE_EPOCH_KEY = f'{GENERATION_NAMESPACE}:database_epoch'
+
+T = TypeVar('T')
+
+
+class CacheStats:
+    """Counters of one cache tier."""
+
+    __slots__ = ('hits', 'misses', 'evictions', 'errors')
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class LRUCache:
+    """Bounded in-process cache, the least recently used entry is evicted first.
+
+    Keys are grouped into namespaces the same way aiocache does it: `<namespace>:<key>`.
+    `generation` moves on with every clear: a value loaded while the cache was cleared
+    is not stored when `set` gets the generation read before the load.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.generation = 0
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any, generation: Optional[int] = None) -> None:  # noqa: A003
+        if generation is not None and generation != self.generation:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        self.generation += 1
+        if namespace is None:
+            self._entries.clear()
+            return
+
+        prefix = f'{namespace}:'
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CircuitBreaker:
+    """Skips a failing dependency for `retry_delay` seconds after a failure.
+
+    The failure is logged once when the breaker opens, not for every call made while it is down.
+    """
+
+    def __init__(self, retry_delay: float) -> None:
+        self.retry_delay = retry_delay
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def record_failure(self, message: str, *args: Any) -> None:
+        if not self.is_open:
+            logger.exception(f'{message}, skipping it for %s seconds', *args, self.retry_delay)
+        self._open_until = time.monotonic() + self.retry_delay
+
+
+class CacheEntry(NamedTuple):
+    """Cached payload with the time it stays fresh until, the time it took to build
+    and the generation of its namespaces it was built in.
+    """
+
+    payload: CachedPayload
+    fresh_until: float
+    load_time: float
+    generation: str = ''
+
+    @classmethod
+    def loads(cls, value: bytes) -> CacheEntry:
+        fresh_until, load_time, generation, etag, body = value.split(b' ', 4)
+        payload = CachedPayload.from_body(body, etag=etag.decode())
+        return cls(payload, float(fresh_until), float(load_time), generation.decode())
+
+    def dumps(self) -> bytes:
+        # The ETag is stored with the body, so a shared hit hashes nothing.
+        return b' '.join([
+            repr(self.fresh_until).encode(),
+            repr(self.load_time).encode(),
+            self.generation.encode(),
+            self.payload.etag.encode(),
+            self.payload.body,
+        ])
+
+    def should_refresh(self, beta: float, now: Optional[float] = None) -> bool:
+        """Whether the entry is stale or randomly picked for refresh ahead of time.
+
+        Probabilistic early expiration: the slower the load and the closer the entry is
+        to going stale, the more likely the refresh, so workers do not refresh in lockstep.
+        """
+        now = time.time() if now is None else now
+        return now - self.load_time * beta * math.log(1 - random.random()) >= self.fresh_until
+
+
+class CacheGenerations(NamedTuple):
+    """Generations of both tiers read before a load, None for the shared one when it can not tell."""
+
+    local: int
+    shared: Optional[Dict[str, str]]
+
+
+class SwitchListCache:
+    """Switch list payloads cached in the worker and shared between workers.
+
+    The local tier is an `LRUCache`, the shared tier is the Redis cache from `setup_cache`,
+    without one (replicas) switch lists are only cached in the worker.
+    Shared hits are promoted to the local tier, shared tier failures are treated as misses
+    and the shared tier is skipped for `shared_retry_delay` seconds after a failure.
+
+    Entries are fresh for `ttl` seconds and may be served stale for `stale_ttl` seconds more
+    while they are refreshed, after that both tiers drop them.
+
+    The shared tier is never scanned: every namespace has a generation counter, clearing
+    a namespace increments it and entries built in an older generation are misses.
+    Callers read the generations of both tiers with `get_generations` before they load
+    a payload and store the payload with them, so a load that races with a change is not kept.
+    """
+
+    def __init__(
+        self,
+        local: LRUCache,
+        shared: Optional[BaseCache],
+        ttl: int,
+        stale_ttl: int = 0,
+        early_refresh_beta: float = 1,
+        shared_retry_delay: float = 0,
+    ) -> None:
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.early_refresh_beta = early_refresh_beta
+        self.shared_stats = CacheStats()
+        self.shared_breaker = CircuitBreaker(shared_retry_delay)
+
+    @property
+    def is_enabled(self) -> bool:
+        # CACHE_TTL=0 means "do not cache".
+        return bool(self.ttl)
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {'local': self.local.stats.as_dict(), 'shared': self.shared_stats.as_dict()}
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entries = await self.multi_get([key])
+        return entries[0]
+
+    async def multi_get(self, keys: List[str]) -> List[Optional[CacheEntry]]:
+        if not self.is_enabled:
+            return [None] * len(keys)
+
+        entries = {key: self.local.get(key) for key in keys}
+        missing_keys = [key for key, entry in entries.items() if entry is None]
+        if missing_keys and self.shared is not None:
+            entries.update(await self._get_shared(missing_keys))
+        return [entries[key] for key in keys]
+
+    async def get_generations(self, keys: List[str]) -> CacheGenerations:
+        return CacheGenerations(local=self.local.generation, shared=await self._get_shared_generations(keys))
+
+    def should_refresh(self, entry: CacheEntry) -> bool:
+        return entry.should_refresh(self.early_refresh_beta)
+
+    async def set(  # noqa: A003
+        self, key: str, payload: CachedPayload, load_time: float = 0, generation: Optional[str] = None,
+    ) -> None:
+        generations = None if generation is None else CacheGenerations(self.local.generation, {key: generation})
+        await self.multi_set([(key, payload)], load_time=load_time, generations=generations)
+
+    async def multi_set(
+        self,
+        pairs: Iterable[Tuple[str, CachedPayload]],
+        load_time: float = 0,
+        generations: Optional[CacheGenerations] = None,
+    ) -> None:
+        """Store the payloads loaded since `generations` were read, unless a tier was cleared meanwhile.
+
+        Without `generations` the payloads are only stored in the local tier.
+        """
+        if not self.is_enabled:
+            return
+
+        fresh_until = time.time() + self.ttl
+        shared_generations = {} if generations is None or generations.shared is None else generations.shared
+        local_generation = None if generations is None else generations.local
+        entries = [
+            (key, CacheEntry(payload, fresh_until, load_time, shared_generations.get(key, '')))
+            for key, payload in pairs
+        ]
+        for key, entry in entries:
+            self.local.set(key, entry, generation=local_generation)
+
+        shared_entries = [(key, entry.dumps()) for key, entry in entries if entry.generation]
+        if shared_entries:
+            await self._set_shared(shared_entries)
+
+    async def resync(self, database_epoch: Optional[int] = None) -> None:
+        """Evict the local tier after a listener reconnect, and the shared one after a database restart.
+
+        Every worker stores the same epoch once it reconnects, so only the first store after
+        a restart moves the generations of the shared entries on.
+        """
+        if database_epoch is not None:
+            await self._set_database_epoch(database_epoch)
+        self.local.clear()
+
+    async def clear(self, namespace: str = SWITCH_LIST_CACHE_NAMESPACE) -> None:
+        """Evict entries of the namespace from both tiers.
+
+        Every worker handling a change moves the shared generation on, the extra moves only cost
+        misses. The generation moves first: a request served between the two steps would otherwise
+        promote the old shared entry back into the cleared local tier.
+        """
+        await self._increment_generation(namespace)
+        self.local.clear(namespace)
+
+    async def _get_shared_generations(self, keys: List[str]) -> Optional[Dict[str, str]]:
+        if not self.is_enabled or self.shared is None or self.shared_breaker.is_open:
+            return None
+
+        generation_keys = sorted({generation_key for key in keys for generation_key in _get_generation_keys(key)})
+        try:
+            values = await self.shared.multi_get(generation_keys, loads_fn=_as_is)
+        except Exception:  # noqa: B902
+            self._record_shared_failure('Failed to read switch list generations from the shared cache')
+            return None
+        return _make_generations(keys, dict(zip(generation_keys, values)))
+
+    async def _get_shared(self, keys: List[str]) -> Dict[str, Optional[CacheEntry]]:
+        generation_keys = sorted({generation_key for key in keys for generation_key in _get_generation_keys(key)})
+        # Shared hits read before a clear of the local tier are not promoted after it.
+        local_generation = self.local.generation
+        values = await self._get_shared_values(keys + generation_keys)
+
+        generations = _make_generations(keys, dict(zip(generation_keys, values[len(keys):])))
+        entries: Dict[str, Optional[CacheEntry]] = {}
+        for key, value in zip(keys, values):
+            entry = None if value is None else CacheEntry.loads(value)
+            entries[key] = entry if entry is not None and entry.generation == generations[key] else None
+            self._count_shared_lookup(key, entries[key], local_generation)
+        return entries
+
+    async def _get_shared_values(self, keys: List[str]) -> List[Optional[bytes]]:
+        if self.shared is None or self.shared_breaker.is_open:
+            return [None] * len(keys)
+
+        try:
+            # Entries and generations are read in one round trip.
+            return await self.shared.multi_get(keys, loads_fn=_as_is)
+        except Exception:  # noqa: B902
+            self._record_shared_failure('Failed to read switch lists from the shared cache')
+            return [None] * len(keys)
+
+    def _count_shared_lookup(self, key: str, entry: Optional[CacheEntry], local_generation: int) -> None:
+        if entry is None:
+            self.shared_stats.misses += 1
+        else:
+            self.shared_stats.hits += 1
+            self.local.set(key, entry, generation=local_generation)
+
+    async def _set_shared(self, pairs: List[Tuple[str, bytes]]) -> None:
+        if self.shared is None or self.shared_breaker.is_open:
+            return
+
+        try:
+            await self.shared.multi_set(pairs, ttl=self.ttl + self.stale_ttl, dumps_fn=_as_is)
+        except Exception:  # noqa: B902
+            self._record_shared_failure('Failed to write switch lists to the shared cache')
+
+    async def _increment_generation(self, namespace: str) -> None:
+        if self.shared is None or self.shared_breaker.is_open:
+            return
+
+        try:
+            await self.shared.increment(make_generation_key(namespace))
+        except Exception:  # noqa: B902
+            self._record_shared_failure('Failed to clear %s in the shared cache', namespace)
+
+    async def _set_database_epoch(self, database_epoch: int) -> None:
+        if self.shared is None or self.shared_breaker.is_open:
+            return
+
+        try:
+            await self.shared.set(DATABASE_EPOCH_KEY, str(database_epoch), dumps_fn=_as_is)
+        except Exception:  # noqa: B902
+            self._record_shared_failure('Failed to store the database epoch in the shared cache')
+
+    def _record_shared_failure(self, message: str, *args: Any) -> None:
+        self.shared_stats.errors += 1
+        self.shared_breaker.record_failure(message, *args)
+
+
+class SingleFlight:
+    """Concurrent loads of the same key share one in-flight task.
+
+    The task is shielded, so a waiter that goes away does not cancel the load for the others.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, load: Callable[[], Awaitable[T]]) -> T:
+        return await asyncio.shield(self.start(key, load))
+
+    def start(self, key: str, load: Callable[[], Awaitable[T]]) -> asyncio.Future:
+        """Return the in-flight task of the key, starting `load` if there is none."""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._tasks[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        return task
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Retrieved even if every waiter has gone away.
+            task.exception()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+def log_failed_refresh(key: str, task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('Background refresh of %s failed', key, exc_info=task.exception())
+
+
+def _as_is(value: Any) -> Any:
+    return value
+
+
+def make_generation_key(namespace: str) -> str:
+    return f'{GENERATION_NAMESPACE}:{namespace}'
+
+
+def _get_generation_keys(key: str) -> Tuple[str, str, str]:
+    # Switch list keys are cleared by a database restart, the whole namespace and the namespace of their group.
+    return (
+        DATABASE_EPOCH_KEY,
+        make_generation_key(SWITCH_LIST_CACHE_NAMESPACE),
+        make_generation_key(key.rpartition(':')[0]),
+    )
+
+
+def _make_generations(keys: List[str], values: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        key: '.'.join(str(int(values[generation_key] or 0)) for generation_key in _get_generation_keys(key))
+        for key in keys
+    }
+
+
+async def close_cache(app: web.Application) -> None:
+    await app[cache_key].close()
 
 
 def setup_cache(app: web.Application) -> None:
-    parsed = urlparse(app[config_key]['cache_url'])
+    config = app[config_key]
+    parsed = urlparse(config['cache_url'])
     cache = Cache(
         Cache.REDIS,
         endpoint=parsed.hostname or 'localhost',
@@ -18,11 +444,93 @@ def setup_cache(app: web.Application) -> None:
     )
     cache.serializer = JsonSerializer()
     app[cache_key] = cache
+    app.on_cleanup.append(close_cache)
+    # Lists built from the in-memory snapshot are cheaper than the Redis round trips of the shared tier.
+    setup_switch_list_cache(app, shared=None if snapshot_key in app else cache)
+
+
+def setup_switch_list_cache(app: web.Application, shared: Optional[BaseCache] = None) -> None:
+    config = app[config_key]
+    switch_list_cache = SwitchListCache(
+        local=LRUCache(
+            max_size=config.SWITCH_LIST_CACHE.LOCAL_MAX_SIZE,
+            ttl=config.CACHE_TTL + config.SWITCH_LIST_CACHE.STALE_TTL,
+        ),
+        shared=shared,
+        ttl=config.CACHE_TTL,
+        stale_ttl=config.SWITCH_LIST_CACHE.STALE_TTL,
+        early_refresh_beta=config.SWITCH_LIST_CACHE.EARLY_REFRESH_BETA,
+        shared_retry_delay=config.SWITCH_LIST_CACHE.SHARED_RETRY_DELAY,
+    )
+    app[switch_list_cache_key] = switch_list_cache
+    app[switch_change_feed_key].subscribe(functools.partial(invalidate_switch_list_cache, switch_list_cache))
+
+
+def switch_list_cache_namespace(group_name: str) -> str:
+    return f'{SWITCH_LIST_CACHE_NAMESPACE}:{group_name}'
+
+
+def make_switch_list_cache_key(group_name: str, version: Optional[int], is_active: Optional[bool]) -> str:
+    return f'{switch_list_cache_namespace(group_name)}:{version}__{is_active}'
+
+
+async def invalidate_switch_list_cache(cache: SwitchListCache, change: SwitchChange) -> None:
+    if change.is_resync:
+        await cache.resync(change.database_epoch)
+        return
+    if change.groups is None:
+        await cache.clear()
+        return
+
+    for group_name in change.groups:
+        await cache.clear(namespace=switch_list_cache_namespace(group_name))
+
+
+def make_switch_full_list_cache_key(request: web.Request) -> str:
+    # Flag URLs in the full list are built from the request origin, other query parameters
+    # are left out of the page. `after=0` is the first page, like no cursor at all.
+    validated_data = request['validated_data']
+    return (
+        f'{SWITCH_FULL_LIST_CACHE_NAMESPACE}:{request.url.origin()}:'
+        f'{validated_data.get("limit")}__{validated_data.get("after") or None}'
+    )
+
+
+async def invalidate_switch_full_list_cache(cache: LRUCache, change: SwitchChange) -> None:
+    cache.clear(SWITCH_FULL_LIST_CACHE_NAMESPACE)
+
+
+def setup_switch_full_list_cache(app: web.Application) -> None:
+    # Keys depend on the Host header and the page, so the cache is bounded like the badge caches.
+    config = app[config_key]
+    cache = LRUCache(max_size=config.SWITCH_FULL_LIST.CACHE_MAX_SIZE, ttl=config.CACHE_TTL)
+    app[switch_full_list_cache_key] = cache
+    app[switch_change_feed_key].subscribe(functools.partial(invalidate_switch_full_list_cache, cache))
+
+
+def make_negative_cache_key(namespace: str, value: Any) -> str:
+    return f'{namespace}:{value}'
+
+
+async def invalidate_negative_cache(cache: LRUCache, change: SwitchChange) -> None:
+    # A created switch brings its id and groups into existence.
+    if change.groups is None:
+        cache.clear()
+        return
+
+    for group_name in change.groups:
+        cache.delete(make_negative_cache_key(MISSING_GROUP_NAMESPACE, group_name))
+    for switch_id in change.switch_ids:
+        cache.delete(make_negative_cache_key(MISSING_SWITCH_NAMESPACE, switch_id))
+
 
+def setup_negative_cache(app: web.Application) -> None:
+    """Groups without switches and switch ids that are not found, remembered for a short time.
 
-def switch_list_cache_key_builder(method: Callable, view: web.View) -> str:
-    validated_data = view.request['validated_data']
-    group_name = validated_data['group']
-    is_active = validated_data.get('is_active')
-    version = validated_data.get('version')
-    return f'switch_list__{group_name}__{version}__{is_active}'
+    Requests for them are answered without a query, and the entries are kept apart from
+    the other caches, so a flood of unknown names or ids does not evict anything useful.
+    """
+    config = app[config_key]
+    cache = LRUCache(max_size=config.NEGATIVE_CACHE.MAX_SIZE, ttl=config.NEGATIVE_CACHE.TTL)
+    app[negative_cache_key] = cache
+    app[switch_change_feed_key].subscribe(functools.partial(invalidate_negative_cache, cache))
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, FrozenSet, Iterable, List, NamedTuple, Optional
+
+import aiopg
+import redis.asyncio as aioredis
+import sqlalchemy as sa
+from aiohttp import web
+from aiopg.sa import SAConnection
+from redis.asyncio.client import PubSub
+from sqlalchemy.sql import ColumnElement
+
+from its_on.app_keys import config_key, redis_change_listener_key, redis_key, switch_change_feed_key
+from its_on.models import switches
+
+logger = logging.getLogger(__name__)
+
+SWITCH_CHANGES_CHANNEL = 'switches_changed'
+LISTENER_RECONNECT_DELAY = 1  # seconds
+
+
+class SwitchChange(NamedTuple):
+    """Switches that have changed.
+
+    `groups` of None means the affected groups are unknown and everything must be invalidated.
+
+    `is_resync` marks the change a worker publishes when its listener (re)connects: nothing
+    is known to have changed, so it only invalidates what the worker keeps in memory.
+    `database_epoch` of a resync identifies the database server start, when it moves
+    every worker reconnected and the changes made meanwhile were missed by all of them.
+    """
+
+    switch_ids: FrozenSet[int]
+    groups: Optional[FrozenSet[str]]
+    is_resync: bool = False
+    database_epoch: Optional[int] = None
+
+    @classmethod
+    def everything(cls) -> SwitchChange:
+        return cls(switch_ids=frozenset(), groups=None)
+
+    @classmethod
+    def resync(cls, database_epoch: Optional[int] = None) -> SwitchChange:
+        return cls(switch_ids=frozenset(), groups=None, is_resync=True, database_epoch=database_epoch)
+
+    @classmethod
+    def from_notification_payload(cls, payload: str) -> SwitchChange:
+        message = json.loads(payload)
+        # The trigger leaves the groups out when they do not fit into a notification.
+        groups = None if message['groups'] is None else frozenset(message['groups'])
+        return cls(switch_ids=frozenset([message['id']]), groups=groups)
+
+    @classmethod
+    def loads(cls, message: str) -> SwitchChange:
+        data = json.loads(message)
+        groups = data['groups']
+        return cls(switch_ids=frozenset(data['ids']), groups=None if groups is None else frozenset(groups))
+
+    @classmethod
+    def merge(cls, changes: Iterable[SwitchChange]) -> SwitchChange:
+        switch_ids: FrozenSet[int] = frozenset()
+        groups: Optional[FrozenSet[str]] = frozenset()
+        for change in changes:
+            switch_ids |= change.switch_ids
+            groups = None if groups is None or change.groups is None else groups | change.groups
+        return cls(switch_ids=switch_ids, groups=groups)
+
+    def dumps(self) -> str:
+        return json.dumps({
+            'ids': sorted(self.switch_ids),
+            'groups': None if self.groups is None else sorted(self.groups),
+        })
+
+
+Subscriber = Callable[[SwitchChange], Awaitable[None]]
+
+
+class SwitchChangeFeed:
+    """In-process fan-out of switch changes.
+
+    Subscribers are awaited one by one in subscription order.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: List[Subscriber] = []
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.append(subscriber)
+
+    async def publish(self, change: SwitchChange) -> None:
+        for subscriber in self._subscribers:
+            try:
+                await subscriber(change)
+            except Exception:  # noqa: B902
+                logger.exception('Switch change subscriber %r failed', subscriber)
+
+
+async def _get_pending_changes(conn: aiopg.Connection) -> SwitchChange:
+    notifications = [await conn.notifies.get()]
+    while not conn.notifies.empty():
+        notifications.append(conn.notifies.get_nowait())
+
+    return SwitchChange.merge(
+        SwitchChange.from_notification_payload(notification.payload) for notification in notifications
+    )
+
+
+async def _get_database_epoch(cursor: aiopg.Cursor) -> int:
+    await cursor.execute('SELECT (extract(epoch FROM pg_postmaster_start_time()) * 1000000)::bigint')
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def listen_switch_changes(dsn: str, feed: SwitchChangeFeed) -> None:
+    """Relay NOTIFY messages from the switches trigger to the feed over a dedicated connection."""
+    while True:
+        try:
+            async with aiopg.connect(dsn) as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(f'LISTEN {SWITCH_CHANGES_CHANNEL}')
+                    database_epoch = await _get_database_epoch(cursor)
+                # Anything could have changed while we were not listening.
+                await feed.publish(SwitchChange.resync(database_epoch=database_epoch))
+
+                while True:
+                    await feed.publish(await _get_pending_changes(conn))
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # noqa: B902
+            logger.exception('Switch changes listener failed, reconnecting')
+        await asyncio.sleep(LISTENER_RECONNECT_DELAY)
+
+
+async def listen_redis_switch_changes(redis_client: aioredis.Redis, channel: str, feed: SwitchChangeFeed) -> None:
+    """Relay changes published by other workers and nodes to the feed."""
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                # Anything could have changed while we were not subscribed.
+                await feed.publish(SwitchChange.resync())
+
+                while True:
+                    await feed.publish(await _get_pending_redis_changes(pubsub))
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # noqa: B902
+            logger.exception('Redis switch changes listener failed, reconnecting')
+        await asyncio.sleep(LISTENER_RECONNECT_DELAY)
+
+
+async def _get_pending_redis_changes(pubsub: PubSub) -> SwitchChange:
+    messages = []
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+    while message is not None:
+        messages.append(message)
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+
+    # A burst of writes, like copying switches from another instance, is handled once.
+    return SwitchChange.merge(SwitchChange.loads(message['data']) for message in messages)
+
+
+async def publish_switch_change(app: web.Application, change: SwitchChange) -> None:
+    """Send the change to every worker of every node, this one included.
+
+    A failed publish only delays the change until the caches expire, the write itself stands.
+    """
+    config = app[config_key]
+    if not config.SWITCH_CHANGE_REDIS.IS_ENABLED or redis_key not in app:
+        return
+
+    try:
+        await app[redis_key].publish(config.SWITCH_CHANGE_REDIS.CHANNEL, change.dumps())
+    except Exception:  # noqa: B902
+        logger.exception('Failed to publish switch change %s', change)
+
+
+async def select_switch_change(conn: SAConnection, condition: ColumnElement) -> SwitchChange:
+    result = await conn.execute(sa.select([switches.c.id, switches.c.groups]).where(condition))
+    rows = await result.fetchall()
+    return SwitchChange(
+        switch_ids=frozenset(row.id for row in rows),
+        groups=frozenset(group_name for row in rows for group_name in row.groups or ()),
+    )
+
+
+@contextlib.asynccontextmanager
+async def publishing_switch_changes(
+    request: web.Request, conn: SAConnection, condition: ColumnElement,
+) -> AsyncIterator[None]:
+    """Publish the change of the switches matching `condition` made inside the block.
+
+    Groups are read before and after the write, so the old and the new groups are both invalidated.
+    """
+    before = await select_switch_change(conn, condition)
+    yield
+    change = SwitchChange.merge([before, await select_switch_change(conn, condition)])
+    if change.switch_ids:
+        await publish_switch_change(request.app, change)
+
+
+async def start_redis_change_listener(app: web.Application) -> None:
+    app[redis_change_listener_key] = asyncio.create_task(
+        listen_redis_switch_changes(
+            app[redis_key], app[config_key].SWITCH_CHANGE_REDIS.CHANNEL, app[switch_change_feed_key],
+        ),
+    )
+
+
+async def stop_redis_change_listener(app: web.Application) -> None:
+    listener = app[redis_change_listener_key]
+    listener.cancel()
+    await asyncio.gather(listener, return_exceptions=True)
+
+
+def setup_change_feed(app: web.Application) -> None:
+    app[switch_change_feed_key] = SwitchChangeFeed()
+
+
+def setup_redis_change_feed(app: web.Application) -> None:
+    if not app[config_key].SWITCH_CHANGE_REDIS.IS_ENABLED:
+        return
+
+    app.on_startup.append(start_redis_change_listener)
+    # Before the Redis client is closed on cleanup.
+    app.on_shutdown.append(stop_redis_change_listener)
@@ -1,10 +1,12 @@
+import asyncio
 from typing import Dict
 from urllib.parse import urlparse
 
 from aiohttp import web
 from aiopg.sa import create_engine
 
-from its_on.app_keys import config_key, db_key
+from its_on.app_keys import config_key, db_key, switch_change_feed_key, switch_change_listener_key
+from its_on.change_feed import listen_switch_changes
 
 
 async def init_pg(app: web.Application) -> None:
@@ -15,9 +17,16 @@ async def init_pg(app: web.Application) -> None:
         echo=config.ENABLE_DB_LOGGING,
     )
     app[db_key] = engine
+    app[switch_change_listener_key] = asyncio.create_task(
+        listen_switch_changes(config.DATABASE.DSN, app[switch_change_feed_key]),
+    )
 
 
 async def close_pg(app: web.Application) -> None:
+    listener = app[switch_change_listener_key]
+    listener.cancel()
+    await asyncio.gather(listener, return_exceptions=True)
+
     app[db_key].close()
     await app[db_key].wait_closed()
 
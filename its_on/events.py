@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import secrets
+from collections import deque
+from typing import Deque, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from aiohttp import web
+
+from its_on.app_keys import config_key, snapshot_key, switch_events_key
+from its_on.snapshot import GroupSwitches, SwitchSnapshot
+
+
+class SwitchEvent(NamedTuple):
+    sequence: int
+    event_id: str
+    group_name: str
+    encoded: bytes
+
+
+class SwitchEventSubscription:
+    """Events of the requested groups queued for one stream.
+
+    A subscriber that falls behind is closed instead of buffering without limit,
+    the client resumes from the broadcaster buffer with Last-Event-ID.
+    """
+
+    def __init__(self, group_names: FrozenSet[str], queue_size: int, initial_events: Iterable[SwitchEvent]) -> None:
+        self.group_names = group_names
+        self._queue: asyncio.Queue[Optional[SwitchEvent]] = asyncio.Queue()
+        self._queue_size = queue_size
+        for event in initial_events:
+            self._queue.put_nowait(event)
+
+    def put(self, event: SwitchEvent) -> None:
+        if self._queue.qsize() >= self._queue_size:
+            self.close()
+        else:
+            self._queue.put_nowait(event)
+
+    def close(self) -> None:
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> Optional[SwitchEvent]:
+        """Return the next event, None once closed, or raise asyncio.TimeoutError."""
+        return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+
+
+class SwitchEventBroadcaster:
+    """Turns snapshot swaps into group change events and fans them out to all streams of the worker."""
+
+    def __init__(self, buffer_size: int, queue_size: int) -> None:
+        # Event ids of another worker or a previous process never match the epoch.
+        self._epoch = secrets.token_hex(4)
+        self._sequence = 0
+        self._buffer: Deque[SwitchEvent] = deque(maxlen=buffer_size)
+        self._queue_size = queue_size
+        self._subscriptions: Set[SwitchEventSubscription] = set()
+        self._snapshot: Optional[SwitchSnapshot] = None
+
+    async def handle_snapshot_swap(self, previous: Optional[SwitchSnapshot], snapshot: SwitchSnapshot) -> None:
+        self._snapshot = snapshot
+        if previous is None:
+            return
+
+        for group_name in sorted(snapshot.get_changed_groups(previous)):
+            self._sequence += 1
+            event = self.make_event(group_name, snapshot.get_group(group_name))
+            self._buffer.append(event)
+            for subscription in self._subscriptions:
+                if group_name in subscription.group_names:
+                    subscription.put(event)
+
+    def subscribe(self, group_names: Iterable[str], last_event_id: Optional[str] = None) -> SwitchEventSubscription:
+        group_names = frozenset(group_names)
+        subscription = SwitchEventSubscription(
+            group_names,
+            queue_size=self._queue_size,
+            initial_events=self.get_missed_events(group_names, last_event_id),
+        )
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: SwitchEventSubscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def close(self) -> None:
+        for subscription in self._subscriptions:
+            subscription.close()
+        self._subscriptions.clear()
+
+    def get_missed_events(self, group_names: FrozenSet[str], last_event_id: Optional[str]) -> List[SwitchEvent]:
+        sequence = self._parse_event_id(last_event_id)
+        if sequence is not None and (not self._buffer or self._buffer[0].sequence <= sequence + 1):
+            return [
+                event for event in self._buffer
+                if event.sequence > sequence and event.group_name in group_names
+            ]
+
+        # Nothing to resume from: send the current state of every requested group.
+        if self._snapshot is None:
+            return []
+        return [
+            self.make_event(group_name, self._snapshot.get_group(group_name))
+            for group_name in sorted(group_names)
+        ]
+
+    def make_event(self, group_name: str, group: GroupSwitches) -> SwitchEvent:
+        names = [record.name for record in group.filter()]
+        data = json.dumps({
+            'group': group_name,
+            'revision': group.revision,
+            'count': len(names),
+            'result': names,
+        })
+        event_id = f'{self._epoch}-{self._sequence}'
+        return SwitchEvent(
+            sequence=self._sequence,
+            event_id=event_id,
+            group_name=group_name,
+            encoded=f'id: {event_id}\nevent: switches\ndata: {data}\n\n'.encode(),
+        )
+
+    def _parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        epoch, _, sequence = (event_id or '').partition('-')
+        if epoch != self._epoch or not sequence.isdigit() or int(sequence) > self._sequence:
+            return None
+        return int(sequence)
+
+
+async def close_switch_events(app: web.Application) -> None:
+    app[switch_events_key].close()
+
+
+def setup_switch_events(app: web.Application) -> None:
+    if snapshot_key not in app:
+        return
+
+    config = app[config_key]
+    broadcaster = SwitchEventBroadcaster(
+        buffer_size=config.SWITCH_EVENTS.BUFFER_SIZE,
+        queue_size=config.SWITCH_EVENTS.QUEUE_SIZE,
+    )
+    app[switch_events_key] = broadcaster
+    app[snapshot_key].add_listener(broadcaster.handle_snapshot_swap)
+    app.on_shutdown.append(close_switch_events)
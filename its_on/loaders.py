@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import sqlalchemy as sa
+from aiohttp import web
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql
+
+from its_on.app_keys import config_key, db_key, switch_change_feed_key, switch_loader_key
+from its_on.cache import LRUCache
+from its_on.change_feed import SwitchChange
+from its_on.models import switches
+
+BatchLoad = Callable[[List[int]], Awaitable[Dict[int, Any]]]
+
+SWITCH_LOADER_CACHE_NAMESPACE = 'switch'
+
+
+class BatchLoader:
+    """Loads ids requested within one event loop tick with a single `batch_load` call.
+
+    Every waiter of an id gets the same result or error. Found objects are kept
+    in a short-lived cache in front of the loader, ids that are not found resolve to None.
+    """
+
+    def __init__(self, batch_load: BatchLoad, cache: LRUCache, namespace: str) -> None:
+        self.batch_load = batch_load
+        self.cache = cache
+        self.namespace = namespace
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    async def load(self, object_id: int) -> Any:
+        cached_object = self.cache.get(self.make_cache_key(object_id))
+        if cached_object is not None:
+            return cached_object
+
+        future = self._pending.get(object_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            future = loop.create_future()
+            self._pending[object_id] = future
+        # A waiter that goes away must not cancel the result for the others.
+        return await asyncio.shield(future)
+
+    def clear(self, object_ids: List[int]) -> None:
+        for object_id in object_ids:
+            self.cache.delete(self.make_cache_key(object_id))
+
+    def make_cache_key(self, object_id: int) -> str:
+        return f'{self.namespace}:{object_id}'
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        asyncio.ensure_future(self._load_batch(pending))
+
+    async def _load_batch(self, pending: Dict[int, asyncio.Future]) -> None:
+        try:
+            objects = await self.batch_load(list(pending))
+        except Exception as exc:  # noqa: B902
+            for future in pending.values():
+                future.set_exception(exc)
+                # Retrieved even if every waiter has gone away.
+                future.exception()
+            return
+
+        for object_id, future in pending.items():
+            loaded_object = objects.get(object_id)
+            if loaded_object is not None:
+                self.cache.set(self.make_cache_key(object_id), loaded_object)
+            future.set_result(loaded_object)
+
+
+async def load_objects_by_ids(app: web.Application, model: Table, object_ids: List[int]) -> Dict[int, Any]:
+    ids = sa.bindparam('ids', value=object_ids, type_=postgresql.ARRAY(sa.Integer))
+    query = model.select().where(model.c.id == sa.any_(ids))
+
+    async with app[db_key].acquire() as conn:
+        result = await conn.execute(query)
+        return {row.id: row for row in await result.fetchall()}
+
+
+async def invalidate_switch_loader(loader: BatchLoader, change: SwitchChange) -> None:
+    if change.groups is None:
+        loader.cache.clear()
+    else:
+        loader.clear(list(change.switch_ids))
+
+
+def setup_switch_loader(app: web.Application, batch_load: Optional[BatchLoad] = None) -> None:
+    config = app[config_key]
+    loader = BatchLoader(
+        batch_load or functools.partial(load_objects_by_ids, app, switches),
+        cache=LRUCache(max_size=config.SWITCH_LOADER.CACHE_MAX_SIZE, ttl=config.SWITCH_LOADER.CACHE_TTL),
+        namespace=SWITCH_LOADER_CACHE_NAMESPACE,
+    )
+    app[switch_loader_key] = loader
+    app[switch_change_feed_key].subscribe(functools.partial(invalidate_switch_loader, loader))
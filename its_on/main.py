@@ -16,16 +16,31 @@ from its_on.config import settings
 import uvloop
 
 from auth.auth import DBAuthorizationPolicy
-from its_on.app_keys import config_key
-from its_on.cache import setup_cache
+from its_on.app_keys import config_key, redis_key
+from its_on.badges import setup_svg_badge_cache
+from its_on.cache import (
+    setup_cache,
+    setup_negative_cache,
+    setup_switch_full_list_cache,
+    setup_switch_list_cache,
+)
+from its_on.change_feed import setup_change_feed, setup_redis_change_feed
 from its_on.db_utils import init_pg, close_pg
+from its_on.events import setup_switch_events
+from its_on.loaders import setup_switch_loader
 from its_on.middlewares import setup_middlewares
-from its_on.routes import setup_routes
+from its_on.replica import setup_replica
+from its_on.routes import setup_replica_routes, setup_routes
+from its_on.snapshot import setup_group_switches_cache, setup_snapshot
+from its_on.snapshot_file import setup_snapshot_file
+from its_on.watch import setup_watch
 
 BASE_DIR = pathlib.Path(__file__).parent.parent
 
 
 async def init_gunicorn_app() -> web.Application:
+    if settings.REPLICA.IS_ENABLED:
+        return await init_replica_app()
     return await init_app()
 
 
@@ -49,6 +64,7 @@ async def init_app(
         max_age=settings.SESSION_MAX_AGE,
     )
     setup(app, storage)
+    app[redis_key] = redis_client
 
     async def dispose_redis_client(app: web.Application) -> None:
         if redis_client is not None:
@@ -73,20 +89,67 @@ async def init_app(
     app.on_startup.append(init_pg)
     app.on_cleanup.append(close_pg)
     app.on_cleanup.append(dispose_redis_client)
+    setup_change_feed(app)
+    setup_redis_change_feed(app)
+    # The snapshot has to be refreshed before cached responses built from it are evicted.
+    setup_snapshot(app)
+    setup_group_switches_cache(app)
+    setup_negative_cache(app)
+    setup_watch(app)
+    setup_switch_events(app)
+    setup_snapshot_file(app)
+    setup_switch_full_list_cache(app)
 
     setup_security(app,
                    SessionIdentityPolicy(session_key='sessionkey'),
                    DBAuthorizationPolicy(app))
 
+    setup_routes(app, BASE_DIR, setup_cors(app))
+    setup_apispec(app)
+    setup_middlewares(app)
+    setup_cache(app)
+    setup_svg_badge_cache(app)
+    setup_switch_loader(app)
+
+    return app
+
+
+async def init_replica_app() -> web.Application:
+    """Read-only mirror of `REPLICA.UPSTREAM_URL`: the public API served from memory.
+
+    There is no database, no sessions and no admin.
+    """
+    app = web.Application()
+
+    app[config_key] = settings
+
+    setup_change_feed(app)
+    setup_replica(app)
+    setup_negative_cache(app)
+    setup_watch(app)
+    setup_switch_events(app)
+    setup_snapshot_file(app)
+
+    setup_replica_routes(app, setup_cors(app))
+    setup_apispec(app)
+    setup_middlewares(app)
+    # Replicas share nothing, not even a Redis cache.
+    setup_switch_list_cache(app)
+    setup_svg_badge_cache(app)
+
+    return app
+
+
+def setup_cors(app: web.Application) -> aiohttp_cors.CorsConfig:
     cors_config = {
         origin: aiohttp_cors.ResourceOptions(
             allow_methods=['GET', 'OPTIONS'], allow_headers=settings.CORS_ALLOW_HEADERS)
         for origin in settings.CORS_ALLOW_ORIGIN
     }
-    cors = aiohttp_cors.setup(app, defaults=cors_config)
+    return aiohttp_cors.setup(app, defaults=cors_config)
 
-    setup_routes(app, BASE_DIR, cors)
 
+def setup_apispec(app: web.Application) -> None:
     setup_aiohttp_apispec(
         app=app,
         title='Flags Bestdoctor',
@@ -95,16 +158,12 @@ async def init_app(
         swagger_path='/api/docs',
         static_path='/assets/swagger',
         request_data_name='validated_data')
-    setup_middlewares(app)
-    setup_cache(app)
-
-    return app
 
 
 def main() -> None:
     logging.basicConfig(level=logging.DEBUG)
     uvloop.install()
-    web.run_app(init_app(), host=settings.HOST, port=settings.PORT)
+    web.run_app(init_gunicorn_app(), host=settings.HOST, port=settings.PORT)
 
 
 if __name__ == '__main__':
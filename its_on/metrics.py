@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Iterator, List, Tuple
+
+from aiohttp import web
+
+from its_on.app_keys import (
+    group_switches_cache_key,
+    negative_cache_key,
+    replica_key,
+    svg_badge_cache_key,
+    svg_board_cache_key,
+    switch_full_list_cache_key,
+    switch_list_cache_key,
+)
+from its_on.cache import CacheStats
+
+CACHE_COUNTERS = (
+    ('hits', 'Cache lookups that found an entry.'),
+    ('misses', 'Cache lookups that found no entry.'),
+    ('evictions', 'Entries evicted to keep the cache within its size.'),
+    ('errors', 'Failed calls to the cache backend.'),
+)
+LOCAL_CACHES = (
+    ('switch_full_list', switch_full_list_cache_key),
+    ('svg_badge', svg_badge_cache_key),
+    ('svg_board', svg_board_cache_key),
+    ('group_switches', group_switches_cache_key),
+    ('negative', negative_cache_key),
+)
+
+
+def get_cache_stats(app: web.Application) -> Iterator[Tuple[str, str, CacheStats]]:
+    """Counters of every cache set up in the app, as (cache, tier, stats)."""
+    if switch_list_cache_key in app:
+        switch_list_cache = app[switch_list_cache_key]
+        yield 'switch_list', 'local', switch_list_cache.local.stats
+        if switch_list_cache.shared is not None:
+            yield 'switch_list', 'shared', switch_list_cache.shared_stats
+
+    for cache_name, key in LOCAL_CACHES:
+        if key in app:
+            yield cache_name, 'local', app[key].stats
+
+
+def make_cache_metric_lines(app: web.Application) -> List[str]:
+    stats = [(cache_name, tier, cache_stats.as_dict()) for cache_name, tier, cache_stats in get_cache_stats(app)]
+    lines = []
+    for counter, description in CACHE_COUNTERS:
+        metric = f'its_on_cache_{counter}_total'
+        lines.extend([f'# HELP {metric} {description}', f'# TYPE {metric} counter'])
+        lines.extend(
+            f'{metric}{{cache="{cache_name}",tier="{tier}"}} {values[counter]}'
+            for cache_name, tier, values in stats
+        )
+    return lines
+
+
+def make_replication_metric_lines(app: web.Application) -> List[str]:
+    lag = app[replica_key].replication_lag
+    return [
+        '# HELP its_on_replication_lag_seconds Seconds since the last successful sync with the upstream.',
+        '# TYPE its_on_replication_lag_seconds gauge',
+        f'its_on_replication_lag_seconds {"NaN" if lag is None else f"{lag:.3f}"}',
+    ]
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    """Metrics in the Prometheus text format."""
+    lines = make_cache_metric_lines(request.app)
+    if replica_key in request.app:
+        lines.extend(make_replication_metric_lines(request.app))
+    return web.Response(text='\n'.join(lines) + '\n', content_type='text/plain', charset='utf-8')
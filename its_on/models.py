@@ -33,6 +33,49 @@ switches = sa.Table(
 sa.Index('idx_name_group_is_active', switches.c.name, switches.c.group, switches.c.is_active)
 sa.Index('idx_name_group_version_is_active',
          switches.c.name, switches.c.group, switches.c.version, switches.c.is_active)
+# Group membership is filtered with `groups @> ARRAY[...]` and `groups && ARRAY[...]`.
+sa.Index('idx_switches_groups', switches.c.groups, postgresql_using='gin')
+
+# Every change of a switch is sent on the `switches_changed` channel with the id, the groups
+# it was or is in. NOTIFY payloads are limited to 8000 bytes, above that the groups are left out
+# and listeners invalidate everything.
+NOTIFY_SWITCH_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_switch_change() RETURNS trigger AS $$
+DECLARE
+    changed_id integer;
+    changed_groups varchar[];
+    payload text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_id := OLD.id;
+        changed_groups := OLD.groups;
+    ELSIF TG_OP = 'UPDATE' THEN
+        changed_id := NEW.id;
+        changed_groups := ARRAY(
+            SELECT DISTINCT unnest(COALESCE(OLD.groups, '{}') || COALESCE(NEW.groups, '{}'))
+        );
+    ELSE
+        changed_id := NEW.id;
+        changed_groups := NEW.groups;
+    END IF;
+
+    payload := json_build_object('id', changed_id, 'groups', COALESCE(changed_groups, '{}'))::text;
+    IF octet_length(payload) >= 8000 THEN
+        payload := json_build_object('id', changed_id, 'groups', NULL)::text;
+    END IF;
+
+    PERFORM pg_notify('switches_changed', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+NOTIFY_SWITCH_CHANGE_TRIGGER = """
+CREATE TRIGGER switches_notify_change
+AFTER INSERT OR UPDATE OR DELETE ON switches
+FOR EACH ROW EXECUTE PROCEDURE notify_switch_change();
+"""
+sa.event.listen(switches, 'after_create', sa.DDL(NOTIFY_SWITCH_CHANGE_FUNCTION))
+sa.event.listen(switches, 'after_create', sa.DDL(NOTIFY_SWITCH_CHANGE_TRIGGER))
 
 
 user_switches = sa.Table(
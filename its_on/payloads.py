@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import functools
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+import brotli
+import msgpack
+from aiohttp import hdrs, web
+from aiohttp.helpers import ETAG_ANY
+
+JSONDumps = Callable[[Any], str]
+
+GZIP_COMPRESS_LEVEL = 6
+BROTLI_QUALITY = 9
+
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+MSGPACK_CONTENT_TYPES = frozenset([MSGPACK_CONTENT_TYPE, 'application/x-msgpack'])
+
+# Content codings in order of preference.
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    'br': functools.partial(brotli.compress, quality=BROTLI_QUALITY),
+    'gzip': functools.partial(gzip.compress, compresslevel=GZIP_COMPRESS_LEVEL, mtime=0),
+}
+
+
+def make_etag(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class EncodedBody:
+    """Response body encoded once, with a strong ETag.
+
+    Compressed variants are built on first use of a content coding and kept with the body,
+    so a cache hit never serialises anything and compresses at most once per coding.
+    """
+
+    __slots__ = ('body', 'etag', '_compressed_bodies')
+
+    def __init__(self, body: bytes, etag: Optional[str] = None) -> None:
+        self.body = body
+        self.etag = make_etag(body) if etag is None else etag
+        self._compressed_bodies: Dict[str, Optional[bytes]] = {}
+
+    @property
+    def etags(self) -> List[str]:
+        return [self.get_etag(coding) for coding in (None, *COMPRESSORS)]
+
+    def get_body(self, coding: Optional[str] = None) -> bytes:
+        compressed_body = None if coding is None else self.get_compressed_body(coding)
+        return self.body if compressed_body is None else compressed_body
+
+    def get_compressed_body(self, coding: str) -> Optional[bytes]:
+        """The body in the content coding, None when it is not smaller than the body."""
+        if coding not in self._compressed_bodies:
+            compressed_body = COMPRESSORS[coding](self.body)
+            self._compressed_bodies[coding] = compressed_body if len(compressed_body) < len(self.body) else None
+        return self._compressed_bodies[coding]
+
+    def get_etag(self, coding: Optional[str] = None) -> str:
+        # Strong validators have to differ between content codings.
+        return self.etag if coding is None else f'{self.etag}-{coding}'
+
+
+class CachedPayload(EncodedBody):
+    """JSON response data encoded once per cache entry.
+
+    The MessagePack variant is encoded on first use and kept with the entry as well.
+    """
+
+    __slots__ = ('_data', '_msgpack_body')
+
+    def __init__(
+        self, data: Any, dumps: JSONDumps = json.dumps, body: Optional[bytes] = None, etag: Optional[str] = None,
+    ) -> None:
+        self._data = data
+        self._msgpack_body: Optional[EncodedBody] = None
+        super().__init__(dumps(data).encode() if body is None else body, etag=etag)
+
+    @property
+    def data(self) -> Any:
+        if self._data is None:
+            self._data = json.loads(self.body)
+        return self._data
+
+    @property
+    def msgpack_body(self) -> EncodedBody:
+        if self._msgpack_body is None:
+            # Aware datetimes are packed with the timestamp extension type.
+            self._msgpack_body = EncodedBody(msgpack.packb(self.data, datetime=True))
+        return self._msgpack_body
+
+    @classmethod
+    def from_body(cls, body: bytes, etag: Optional[str] = None) -> CachedPayload:
+        """Rebuild a payload from a JSON body encoded by another worker, the data is decoded on first use."""
+        return cls(None, body=body, etag=etag)
+
+
+def get_accepted_encodings(request: web.Request) -> FrozenSet[str]:
+    return _get_accepted_values(request.headers.get(hdrs.ACCEPT_ENCODING, ''))
+
+
+def get_encoding_qualities(request: web.Request) -> Dict[str, float]:
+    return _get_qualities(request.headers.get(hdrs.ACCEPT_ENCODING, ''))
+
+
+def accepts_msgpack(request: web.Request) -> bool:
+    """Whether the client prefers MessagePack to JSON, JSON wins ties."""
+    qualities = _get_qualities(request.headers.get(hdrs.ACCEPT, ''))
+    msgpack_quality = max(qualities.get(content_type, 0) for content_type in MSGPACK_CONTENT_TYPES)
+    json_quality = qualities.get('application/json', qualities.get('application/*', qualities.get('*/*', 0)))
+    return msgpack_quality > json_quality
+
+
+def _get_accepted_values(header_value: str) -> FrozenSet[str]:
+    return frozenset(value for value, quality in _get_qualities(header_value).items() if quality > 0)
+
+
+def _get_qualities(header_value: str) -> Dict[str, float]:
+    qualities = {}
+    for item in header_value.split(','):
+        value, _, params = item.strip().lower().partition(';')
+        if value:
+            qualities[value.strip()] = _get_quality(params)
+    return qualities
+
+
+def _get_quality(params: str) -> float:
+    quality = params.strip().partition('q=')[2]
+    try:
+        return float(quality) if quality else 1
+    except ValueError:
+        return 0
+
+
+def is_not_modified(request: web.Request, *etags: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    return any(candidate.value in (*etags, ETAG_ANY) for candidate in if_none_match)
+
+
+def negotiate_content_coding(request: web.Request, codings: Iterable[str]) -> Optional[str]:
+    """Pick the coding of `codings` with the highest q, None means the identity coding.
+
+    The order of `codings` only breaks ties. `*` stands for the codings the header
+    does not name, `gzip;q=0, *` refuses gzip.
+    """
+    qualities = get_encoding_qualities(request)
+    coding_qualities = {coding: qualities.get(coding, qualities.get('*', 0)) for coding in codings}
+    # max keeps the first of equal items.
+    coding = max(coding_qualities, key=coding_qualities.__getitem__, default=None)
+    if coding is None or coding_qualities[coding] <= 0 or coding_qualities[coding] < qualities.get('identity', 0):
+        return None
+    return coding
+
+
+def make_payload_response(
+    request: web.Request,
+    payload: EncodedBody,
+    content_type: str = 'application/json',
+    charset: Optional[str] = 'utf-8',
+) -> web.Response:
+    coding = negotiate_content_coding(request, COMPRESSORS)
+    if coding is not None and payload.get_compressed_body(coding) is None:
+        coding = None
+
+    if is_not_modified(request, *payload.etags):
+        response = web.Response(status=web.HTTPNotModified.status_code)
+    else:
+        response = web.Response(body=payload.get_body(coding), content_type=content_type, charset=charset)
+        if coding is not None:
+            response.headers[hdrs.CONTENT_ENCODING] = coding
+
+    response.etag = payload.get_etag(coding)
+    response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    return response
+
+
+def make_cached_payload_response(request: web.Request, payload: CachedPayload) -> web.Response:
+    """JSON or MessagePack response for the payload, whichever the client asked for with Accept."""
+    if accepts_msgpack(request):
+        response = make_payload_response(request, payload.msgpack_body, content_type=MSGPACK_CONTENT_TYPE, charset=None)
+    else:
+        response = make_payload_response(request, payload)
+    response.headers[hdrs.VARY] = f'{hdrs.ACCEPT}, {hdrs.ACCEPT_ENCODING}'
+    return response
@@ -3,7 +3,7 @@ from __future__ import annotations
 from aiohttp import web
 from sqlalchemy import text
 
-from its_on.app_keys import db_key
+from its_on.app_keys import db_key, replica_key
 
 _PROBE_ALLOW = 'GET, OPTIONS'
 
@@ -13,6 +13,10 @@ def _probe_options_response() -> web.Response:
 
 
 async def is_app_healthy(request: web.Request) -> bool:
+    if replica_key in request.app:
+        # A replica is ready once it has synced with the upstream.
+        return request.app[replica_key].synced_at is not None
+
     try:
         async with request.app[db_key].acquire() as conn:
             await conn.execute(text('SELECT 1'))
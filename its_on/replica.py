@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import datetime
+import functools
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from its_on.app_keys import (
+    config_key,
+    replica_key,
+    snapshot_key,
+    switch_change_feed_key,
+)
+from its_on.change_feed import SwitchChange, SwitchChangeFeed
+from its_on.loaders import setup_switch_loader
+from its_on.snapshot import SwitchRecord, SwitchSnapshot, SwitchSnapshotEngine
+from its_on.upstream import SwitchesFullInfoFetcher
+from its_on.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+FULL_INFO_PATH = '/api/v1/switches_full_info'
+
+
+class ReplicaSnapshot(SwitchSnapshot):
+    """Snapshot of the upstream switches.
+
+    Deleted switches are left out of the groups like in `SwitchSnapshot`,
+    but stay available by id for badges.
+    """
+
+    def __init__(self, records: Iterable[SwitchRecord], loaded_at: float) -> None:
+        self.records_by_id: Dict[int, SwitchRecord] = {record.id: record for record in records}
+        now = utc_now()
+        super().__init__(
+            [record for record in self.records_by_id.values() if record.is_visible(now)],
+            loaded_at=loaded_at,
+        )
+
+    def get_change(self, previous: ReplicaSnapshot) -> SwitchChange:
+        changed_records = [
+            (self.records_by_id.get(switch_id), previous.records_by_id.get(switch_id))
+            for switch_id in self.records_by_id.keys() | previous.records_by_id.keys()
+            if self.records_by_id.get(switch_id) != previous.records_by_id.get(switch_id)
+        ]
+        return SwitchChange(
+            switch_ids=frozenset(record.id for pair in changed_records for record in pair if record),
+            groups=frozenset(group for pair in changed_records for record in pair if record for group in record.groups),
+        )
+
+
+class ReplicaSnapshotEngine(SwitchSnapshotEngine):
+    """Snapshot engine that mirrors the full list of an upstream its_on instead of the database."""
+
+    snapshot_class = ReplicaSnapshot
+
+    def __init__(self, upstream_url: str, page_size: int, timeout: float, refresh_interval: float) -> None:
+        super().__init__(refresh_interval=refresh_interval)
+        self.upstream_url = upstream_url
+        self.page_size = page_size
+        self.timeout = timeout
+        self.synced_at: Optional[float] = None
+        self._session: Optional[ClientSession] = None
+        self._fetcher: Optional[SwitchesFullInfoFetcher] = None
+        # ETags of the upstream pages the current snapshot was built from.
+        self._snapshot_etags: Optional[Tuple[str, ...]] = None
+        self._loaded_etags: Optional[Tuple[str, ...]] = None
+
+    @property
+    def replication_lag(self) -> Optional[float]:
+        """Seconds since the last successful sync, None before the first one."""
+        return None if self.synced_at is None else time.time() - self.synced_at
+
+    async def start(self, db: Any = None) -> None:
+        self._session = ClientSession(timeout=ClientTimeout(total=self.timeout))
+        url = f'{self.upstream_url.rstrip("/")}{FULL_INFO_PATH}'
+        self._fetcher = SwitchesFullInfoFetcher(self._session, url, self.page_size)
+        await super().start(db)
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._fetcher = None
+
+    async def load_by_ids(self, switch_ids: List[int]) -> Dict[int, SwitchRecord]:
+        snapshot = await self.get_snapshot()
+        if not isinstance(snapshot, ReplicaSnapshot):
+            raise TypeError('Replica snapshot expected')
+        records_by_id = snapshot.records_by_id
+        return {switch_id: records_by_id[switch_id] for switch_id in switch_ids if switch_id in records_by_id}
+
+    async def _reload(self) -> SwitchSnapshot:
+        requested_at = time.time()
+        snapshot = await super()._reload()
+        # The sync only counts once its records are parsed and the snapshot is swapped.
+        self.synced_at = requested_at
+        self._snapshot_etags = self._loaded_etags
+        return snapshot
+
+    async def _load_records(self) -> Optional[List[SwitchRecord]]:
+        if self._fetcher is None:
+            raise RuntimeError('Switch snapshot engine is not started')
+
+        full_info = await self._fetcher.fetch()
+        if self._snapshot is not None and full_info.etags is not None and full_info.etags == self._snapshot_etags:
+            # The upstream pages are still the ones of the current snapshot.
+            return None
+
+        records = [parse_switch_record(data) for data in full_info.result]
+        self._loaded_etags = full_info.etags
+        return records
+
+
+def parse_switch_record(data: Dict[str, Any]) -> SwitchRecord:
+    deleted_at = data.get('deleted_at')
+    return SwitchRecord(
+        id=data['id'],
+        name=data['name'],
+        is_active=data['is_active'],
+        version=data['version'],
+        deleted_at=deleted_at and datetime.datetime.fromisoformat(deleted_at),
+        groups=tuple(data['groups'] or ()),
+    )
+
+
+async def publish_upstream_changes(
+    feed: SwitchChangeFeed, previous: Optional[SwitchSnapshot], snapshot: SwitchSnapshot,
+) -> None:
+    # The replica has no database notifications, changes are found by comparing snapshots.
+    if isinstance(previous, ReplicaSnapshot) and isinstance(snapshot, ReplicaSnapshot):
+        change = snapshot.get_change(previous)
+        if change.switch_ids:
+            await feed.publish(change)
+
+
+async def start_replica(app: web.Application) -> None:
+    await app[replica_key].start()
+
+
+async def stop_replica(app: web.Application) -> None:
+    await app[replica_key].stop()
+
+
+def setup_replica(app: web.Application) -> None:
+    """Serve the switches of the upstream from memory, in place of `setup_snapshot` and the database."""
+    config = app[config_key]
+    engine = ReplicaSnapshotEngine(
+        upstream_url=config.REPLICA.UPSTREAM_URL,
+        page_size=config.REPLICA.PAGE_SIZE,
+        timeout=config.REPLICA.TIMEOUT,
+        refresh_interval=config.REPLICA.REFRESH_INTERVAL,
+    )
+    app[replica_key] = engine
+    app[snapshot_key] = engine
+    engine.add_listener(functools.partial(publish_upstream_changes, app[switch_change_feed_key]))
+    app.on_startup.append(start_replica)
+    app.on_shutdown.append(stop_replica)
+    # Badges look switches up by id through the same loader as on the primary.
+    setup_switch_loader(app, batch_load=engine.load_by_ids)
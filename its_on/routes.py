@@ -5,10 +5,20 @@ from typing import TYPE_CHECKING
 from aiohttp.web import Application
 from aiohttp_cors import CorsConfig
 from its_on.config import settings
+from its_on.app_keys import snapshot_key
 from its_on.probes import liveness_probe, readiness_probe, startup_probe
+from its_on.metrics import metrics_view
 
 from auth.views import KeycloakCallbackView, KeycloakLoginView, LoginView, LogoutView
-from its_on.views import SwitchFullListView, SwitchListView, SwitchSvgBadgeView
+from its_on.views import (
+    SwitchBatchListView,
+    SwitchEventsView,
+    SwitchFullListView,
+    SwitchGroupBoardView,
+    SwitchListView,
+    SwitchSvgBadgeView,
+    SwitchWatchView,
+)
 from its_on.admin.views.switches import (
     SwitchAddAdminView,
     SwitchDeleteAdminView,
@@ -23,13 +33,8 @@ if TYPE_CHECKING:
 
 
 def setup_routes(app: Application, base_dir: Path, cors_config: CorsConfig) -> None:
-    for path, handler in (
-        ('/lullz', liveness_probe),
-        ('/readyz', readiness_probe),
-        ('/healthz', startup_probe),
-    ):
-        app.router.add_route('GET', path, handler)
-        app.router.add_route('OPTIONS', path, handler)
+    setup_probe_routes(app)
+    app.router.add_get('/metrics', metrics_view)
 
     app.router.add_view('/zbs/login', LoginView, name='login_view')
     app.router.add_view('/zbs/logout', LogoutView)
@@ -46,9 +51,43 @@ def setup_routes(app: Application, base_dir: Path, cors_config: CorsConfig) -> N
     app.router.add_view('/zbs/users', UserListAdminView)
     app.router.add_view('/zbs/users/{id}', UserDetailAdminView)
 
+    setup_api_routes(app, cors_config)
+
+    if settings.ENVIRONMENT == 'Dev':
+        app.router.add_static('/static', str(base_dir / 'its_on' / 'static'))
+
+
+def setup_replica_routes(app: Application, cors_config: CorsConfig) -> None:
+    """Public API served by a read-only replica, without the admin and the database-only endpoints."""
+    setup_probe_routes(app)
+    app.router.add_get('/metrics', metrics_view)
+    setup_api_routes(app, cors_config, with_full_info=False)
+
+
+def setup_probe_routes(app: Application) -> None:
+    for path, handler in (
+        ('/lullz', liveness_probe),
+        ('/readyz', readiness_probe),
+        ('/healthz', startup_probe),
+    ):
+        app.router.add_route('GET', path, handler)
+        app.router.add_route('OPTIONS', path, handler)
+
+
+def setup_api_routes(app: Application, cors_config: CorsConfig, with_full_info: bool = True) -> None:
     get_switch_view = app.router.add_view('/api/v1/switch', SwitchListView)
     cors_config.add(get_switch_view)
 
+    get_switch_batch_view = app.router.add_view('/api/v1/switch/batch', SwitchBatchListView)
+    cors_config.add(get_switch_batch_view)
+
+    if snapshot_key in app:
+        get_switch_watch_view = app.router.add_view('/api/v1/switch/watch', SwitchWatchView)
+        cors_config.add(get_switch_watch_view)
+
+        get_switch_events_view = app.router.add_view('/api/v1/switch/events', SwitchEventsView)
+        cors_config.add(get_switch_events_view)
+
     get_switch_svg_badge_view = app.router.add_view(
         '/api/v1/switches/{id}/svg-badge',
         SwitchSvgBadgeView,
@@ -56,9 +95,13 @@ def setup_routes(app: Application, base_dir: Path, cors_config: CorsConfig) -> N
     )
     cors_config.add(get_switch_svg_badge_view)
 
-    if settings.ENABLE_SWITCHES_FULL_INFO_ENDPOINT:
+    get_switch_group_board_view = app.router.add_view(
+        '/api/v1/switch/board',
+        SwitchGroupBoardView,
+        name='switch_group_board',
+    )
+    cors_config.add(get_switch_group_board_view)
+
+    if with_full_info and settings.ENABLE_SWITCHES_FULL_INFO_ENDPOINT:
         get_switch_full_view = app.router.add_view('/api/v1/switches_full_info', SwitchFullListView)
         cors_config.add(get_switch_full_view)
-
-    if settings.ENVIRONMENT == 'Dev':
-        app.router.add_static('/static', str(base_dir / 'its_on' / 'static'))
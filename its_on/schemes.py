@@ -1,5 +1,8 @@
+from its_on.config import settings
 from marshmallow import Schema, fields, validate, EXCLUDE
 
+TIMESTAMP_DESCRIPTION = 'ISO 8601 string in JSON, timestamp extension type in MessagePack'
+
 
 class SwitchListRequestSchema(Schema):
     group = fields.Str(required=True, metadata={'description': 'group'})
@@ -12,7 +15,45 @@ class SwitchListResponseSchema(Schema):
     result = fields.List(fields.String)
 
 
+class SwitchWatchRequestSchema(SwitchListRequestSchema):
+    revision = fields.Str(metadata={'description': 'last seen revision of the group'})
+    timeout = fields.Int(
+        validate=validate.Range(min=1, max=settings.SWITCH_WATCH.MAX_TIMEOUT),
+        metadata={'description': 'seconds to wait for changes'},
+    )
+
+
+class SwitchWatchResponseSchema(SwitchListResponseSchema):
+    revision = fields.String()
+
+
+class SwitchBatchListRequestSchema(Schema):
+    group = fields.List(
+        fields.Str(), required=True, validate=validate.Length(min=1),
+        metadata={'description': 'groups, the parameter may be repeated'},
+    )
+    is_active = fields.Boolean(metadata={'description': 'is active'})
+    version = fields.Int()
+
+
+class SwitchBatchListResponseSchema(Schema):
+    result = fields.Dict(keys=fields.String(), values=fields.Nested(SwitchListResponseSchema))
+
+
+class SwitchEventsRequestSchema(Schema):
+    group = fields.List(
+        fields.Str(), required=True, validate=validate.Length(min=1),
+        metadata={'description': 'groups, the parameter may be repeated'},
+    )
+
+
+class SwitchGroupBoardRequestSchema(Schema):
+    group = fields.Str(required=True, metadata={'description': 'group'})
+    version = fields.Int()
+
+
 class SwitchScheme(Schema):
+    id = fields.Integer()  # noqa: A003, VNE003
     name = fields.String()
     is_active = fields.Boolean()
     is_hidden = fields.Boolean()
@@ -20,11 +61,28 @@ class SwitchScheme(Schema):
     groups = fields.List(fields.String)
     version = fields.String()
     comment = fields.String()
+    ttl = fields.Integer()
+    created_at = fields.DateTime(metadata={'description': TIMESTAMP_DESCRIPTION})
+    updated_at = fields.DateTime(metadata={'description': TIMESTAMP_DESCRIPTION})
+    deleted_at = fields.DateTime(allow_none=True, metadata={'description': TIMESTAMP_DESCRIPTION})
     flag_url = fields.URL()
 
 
+class SwitchFullListRequestSchema(Schema):
+    stream = fields.Boolean(metadata={'description': 'stream the list without caching, ignored for pages'})
+    limit = fields.Int(
+        validate=validate.Range(min=1, max=settings.SWITCH_FULL_LIST.MAX_PAGE_SIZE),
+        metadata={'description': 'page size, the list is not paginated without it'},
+    )
+    after = fields.Int(
+        validate=validate.Range(min=0),
+        metadata={'description': 'cursor from the `next` link of the previous page'},
+    )
+
+
 class SwitchFullListResponseSchema(Schema):
     result = fields.List(fields.Nested(SwitchScheme))
+    next = fields.URL(allow_none=True, metadata={'description': 'next page, only with `limit`'})  # noqa: A003, VNE003
 
 
 class SwitchRemoteDataSchema(Schema):
@@ -47,3 +105,11 @@ class RemoteSwitchesDataSchema(Schema):
         unknown = EXCLUDE
 
     result = fields.List(fields.Nested(SwitchRemoteDataSchema))
+
+
+class RemoteSwitchesPageSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    result = fields.List(fields.Raw(), required=True)
+    next = fields.Str(allow_none=True, load_default=None)  # noqa: A003, VNE003
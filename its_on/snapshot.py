@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import datetime
+import functools
+import logging
+import time
+from operator import attrgetter
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Type
+
+from aiohttp import web
+from aiopg.sa import Engine
+from aiopg.sa.result import RowProxy
+from sqlalchemy.sql import Select
+
+from its_on.app_keys import config_key, db_key, group_switches_cache_key, snapshot_key, switch_change_feed_key
+from its_on.cache import LRUCache
+from its_on.change_feed import SwitchChange
+from its_on.models import switches
+from its_on.payloads import make_etag
+from its_on.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+GROUP_SWITCHES_CACHE_NAMESPACE = 'group_switches'
+
+
+class SwitchRecord(NamedTuple):
+    id: int  # noqa: A003, VNE003
+    name: str
+    is_active: Optional[bool]
+    version: Optional[int]
+    deleted_at: Optional[datetime.datetime]
+    groups: Tuple[str, ...]
+
+    @property
+    def sort_key(self) -> Tuple[str, str]:
+        # Close to the en_US database collation switch lists used to be sorted with:
+        # case-insensitive, lower case first on ties. Unlike glibc, punctuation is not skipped.
+        return self.name.casefold(), self.name.swapcase()
+
+    @classmethod
+    def from_row(cls, row: RowProxy) -> SwitchRecord:
+        return cls(
+            id=row.id,
+            name=row.name,
+            is_active=row.is_active,
+            version=row.version,
+            deleted_at=row.deleted_at,
+            groups=tuple(row.groups or ()),
+        )
+
+    def is_visible(self, now: datetime.datetime) -> bool:
+        return self.deleted_at is None or self.deleted_at > now
+
+    def matches_version(self, version: Optional[int]) -> bool:
+        # Mirrors SQL semantics of `version <= :version`: NULL versions never match.
+        return version is None or (self.version is not None and self.version <= version)
+
+
+class GroupSwitches:
+    """Switches of a single group, sorted by `SwitchRecord.sort_key`.
+
+    `version_thresholds` are the distinct switch versions of the group in ascending order:
+    every requested version between two neighbouring thresholds selects the same switches.
+    """
+
+    __slots__ = ('records', 'version_thresholds', '_revision')
+
+    def __init__(self, records: Iterable[SwitchRecord] = ()) -> None:
+        self.records: Tuple[SwitchRecord, ...] = tuple(sorted(records, key=attrgetter('sort_key')))
+        self.version_thresholds: Tuple[int, ...] = tuple(sorted({
+            record.version for record in self.records if record.version is not None
+        }))
+        self._revision: Optional[str] = None
+
+    @property
+    def revision(self) -> str:
+        """Content hash of the group, stable across workers and refreshes."""
+        if self._revision is None:
+            state = [
+                (record.id, record.name, record.is_active, record.version, record.deleted_at)
+                for record in self.records
+            ]
+            self._revision = make_etag(repr(state).encode())
+        return self._revision
+
+    def get_version_bucket(self, version: Optional[int]) -> Optional[int]:
+        """The version that selects the same switches of the group as `version` does.
+
+        It is the highest threshold at or below `version`, so clients of any build share cache entries.
+        """
+        if version is None:
+            return None
+
+        index = bisect.bisect_right(self.version_thresholds, version)
+        if index:
+            return self.version_thresholds[index - 1]
+        # Below the lowest threshold no switch with a version matches.
+        return self.version_thresholds[0] - 1 if self.version_thresholds else 0
+
+    def filter(  # noqa: A003
+        self,
+        is_active: bool = True,
+        version: Optional[int] = None,
+        now: Optional[datetime.datetime] = None,
+    ) -> List[SwitchRecord]:
+        now = now or utc_now()
+        return [
+            record for record in self.records
+            if record.is_active is is_active and record.is_visible(now) and record.matches_version(version)
+        ]
+
+
+EMPTY_GROUP = GroupSwitches()
+
+
+class SwitchSnapshot:
+    """Immutable view of the switches table, indexed by group.
+
+    Rows that are already deleted at load time are left out; rows hidden in the future
+    are kept and filtered out at read time.
+    """
+
+    def __init__(self, records: Iterable[SwitchRecord], loaded_at: float) -> None:
+        grouped: Dict[str, List[SwitchRecord]] = {}
+        for record in records:
+            for group_name in record.groups:
+                grouped.setdefault(group_name, []).append(record)
+
+        self.groups: Dict[str, GroupSwitches] = {
+            group_name: GroupSwitches(group_records) for group_name, group_records in grouped.items()
+        }
+        self.loaded_at = loaded_at
+
+    def get_group(self, group_name: str) -> GroupSwitches:
+        return self.groups.get(group_name, EMPTY_GROUP)
+
+    def get_changed_groups(self, previous: Optional[SwitchSnapshot]) -> Set[str]:
+        if previous is None:
+            return set(self.groups)
+        return {
+            group_name for group_name in self.groups.keys() | previous.groups.keys()
+            if self.get_group(group_name).revision != previous.get_group(group_name).revision
+        }
+
+
+def select_switch_records() -> Select:
+    return switches.select().with_only_columns(
+        switches.c.id,
+        switches.c.name,
+        switches.c.is_active,
+        switches.c.version,
+        switches.c.deleted_at,
+        switches.c.groups,
+    )
+
+
+SnapshotListener = Callable[[Optional[SwitchSnapshot], SwitchSnapshot], Awaitable[None]]
+
+
+class SwitchSnapshotEngine:
+    """Keeps the per-worker switch snapshot and swaps it atomically on refresh.
+
+    With `refresh_interval` of zero there is no background refresh and
+    every read reloads the snapshot.
+    """
+
+    snapshot_class: Type[SwitchSnapshot] = SwitchSnapshot
+
+    def __init__(self, refresh_interval: float) -> None:
+        self.refresh_interval = refresh_interval
+        self._db: Optional[Engine] = None
+        self._snapshot: Optional[SwitchSnapshot] = None
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._listeners: List[SnapshotListener] = []
+
+    def add_listener(self, listener: SnapshotListener) -> None:
+        """Register a coroutine called with the previous and the new snapshot after every swap."""
+        self._listeners.append(listener)
+
+    async def start(self, db: Engine) -> None:
+        self._db = db
+        if self.refresh_interval:
+            self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def get_snapshot(self) -> SwitchSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None or not self.refresh_interval:
+            snapshot = await self.refresh()
+        return snapshot
+
+    async def refresh(self) -> SwitchSnapshot:
+        requested_at = time.monotonic()
+        async with self._refresh_lock:
+            snapshot = self._snapshot
+            # A load that started after this call was made is fresh enough to share.
+            if snapshot is None or snapshot.loaded_at < requested_at:
+                snapshot = await self._reload()
+            return snapshot
+
+    async def handle_switch_change(self, change: SwitchChange) -> None:
+        await self.refresh()
+
+    def get_queryset(self) -> Select:
+        return select_switch_records().where(switches.c.deleted_at.is_(None) | (switches.c.deleted_at > utc_now()))
+
+    async def _reload(self) -> SwitchSnapshot:
+        started_at = time.monotonic()
+        records = await self._load_records()
+        if records is None and self._snapshot is not None:
+            return self._snapshot
+        previous, self._snapshot = self._snapshot, self.snapshot_class(records or (), loaded_at=started_at)
+        await self._notify_listeners(previous, self._snapshot)
+        return self._snapshot
+
+    async def _load_records(self) -> Optional[List[SwitchRecord]]:
+        """Records of the new snapshot, None when nothing has changed since the current one was loaded."""
+        if self._db is None:
+            raise RuntimeError('Switch snapshot engine is not started')
+
+        async with self._db.acquire() as conn:
+            result = await conn.execute(self.get_queryset())
+            rows = await result.fetchall()
+
+        return [SwitchRecord.from_row(row) for row in rows]
+
+    async def _notify_listeners(self, previous: Optional[SwitchSnapshot], snapshot: SwitchSnapshot) -> None:
+        for listener in self._listeners:
+            try:
+                await listener(previous, snapshot)
+            except Exception:  # noqa: B902
+                logger.exception('Switch snapshot listener %r failed', listener)
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:  # noqa: B902
+                logger.exception('Failed to refresh switch snapshot')
+            await asyncio.sleep(self.refresh_interval)
+
+
+def make_group_switches_cache_key(group_name: str) -> str:
+    return f'{GROUP_SWITCHES_CACHE_NAMESPACE}:{group_name}'
+
+
+async def invalidate_group_switches_cache(cache: LRUCache, change: SwitchChange) -> None:
+    if change.groups is None:
+        cache.clear()
+        return
+
+    for group_name in change.groups:
+        cache.delete(make_group_switches_cache_key(group_name))
+
+
+async def start_snapshot(app: web.Application) -> None:
+    await app[snapshot_key].start(app[db_key])
+
+
+async def stop_snapshot(app: web.Application) -> None:
+    await app[snapshot_key].stop()
+
+
+def setup_snapshot(app: web.Application) -> None:
+    config = app[config_key]
+    if not config.SWITCH_SNAPSHOT.IS_ENABLED:
+        return
+
+    engine = SwitchSnapshotEngine(refresh_interval=config.SWITCH_SNAPSHOT.REFRESH_INTERVAL)
+    app[snapshot_key] = engine
+    app[switch_change_feed_key].subscribe(engine.handle_switch_change)
+    app.on_startup.append(start_snapshot)
+    app.on_shutdown.append(stop_snapshot)
+
+
+def setup_group_switches_cache(app: web.Application) -> None:
+    """Without the snapshot, rows of recently requested groups are kept one group at a time.
+
+    One query per group serves every `is_active` and `version` filter, they are applied in memory.
+    """
+    if snapshot_key in app:
+        return
+
+    config = app[config_key]
+    cache = LRUCache(max_size=config.GROUP_SWITCHES_CACHE.MAX_SIZE, ttl=config.GROUP_SWITCHES_CACHE.TTL)
+    app[group_switches_cache_key] = cache
+    app[switch_change_feed_key].subscribe(functools.partial(invalidate_group_switches_cache, cache))
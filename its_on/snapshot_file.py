@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+from typing import Iterator, Optional, Tuple
+
+from aiohttp import web
+
+from its_on.app_keys import config_key, snapshot_key
+from its_on.snapshot import SwitchSnapshot
+from its_on_client.mmap_snapshot import SwitchState, pack_snapshot, write_snapshot_file
+
+
+def iter_switch_states(snapshot: SwitchSnapshot) -> Iterator[Tuple[str, str, SwitchState]]:
+    """Switches of every group as `/api/v1/switch` sees them, before the active, version and hidden filters."""
+    for group_name, group in snapshot.groups.items():
+        for record in group.records:
+            yield group_name, record.name, SwitchState(
+                is_active=record.is_active is True,
+                version=record.version,
+                deleted_at=None if record.deleted_at is None else record.deleted_at.timestamp(),
+            )
+
+
+async def export_snapshot_file(path: str, previous: Optional[SwitchSnapshot], snapshot: SwitchSnapshot) -> None:
+    if previous is not None and not snapshot.get_changed_groups(previous):
+        return
+
+    data = pack_snapshot(iter_switch_states(snapshot))
+    await asyncio.get_running_loop().run_in_executor(None, write_snapshot_file, path, data)
+
+
+def setup_snapshot_file(app: web.Application) -> None:
+    """Mirror every snapshot swap to `SWITCH_SNAPSHOT.FILE_PATH` for `its_on_client.mmap_snapshot` readers."""
+    file_path = app[config_key].SWITCH_SNAPSHOT.FILE_PATH
+    if snapshot_key not in app or not file_path:
+        return
+
+    app[snapshot_key].add_listener(functools.partial(export_snapshot_file, file_path))
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from aiohttp import ClientSession, hdrs, web
+from yarl import URL
+
+from its_on.schemes import RemoteSwitchesPageSchema
+
+
+class SwitchesFullInfo(NamedTuple):
+    """Full list of another its_on instance.
+
+    `etags` of the pages identify the list, they are None when a page came without one.
+    """
+
+    result: List[Any]
+    etags: Optional[Tuple[str, ...]]
+
+
+class SwitchesFullInfoFetcher:
+    """Fetches the full list of another its_on instance page by page following `next` links.
+
+    Pages are requested again with the ETag they had on the previous fetch,
+    the ones that have not changed come back as 304 and are reused.
+    Instances without pagination ignore `limit` and return everything on one page.
+    """
+
+    def __init__(self, session: ClientSession, url: str, page_size: int) -> None:
+        self.session = session
+        self.url = str(URL(url).update_query(limit=page_size))
+        self._page_validator = RemoteSwitchesPageSchema()
+        self._pages: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+
+    async def fetch(self) -> SwitchesFullInfo:
+        pages: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        page_url: Optional[str] = self.url
+        while page_url:
+            pages[page_url] = await self._fetch_page(page_url)
+            page_url = pages[page_url][1]['next']
+
+        # Pages no longer linked from the list are forgotten.
+        self._pages = {url: (etag, page) for url, (etag, page) in pages.items() if etag}
+        etags = tuple(etag for etag, _ in pages.values() if etag)
+        return SwitchesFullInfo(
+            result=[data for _, page in pages.values() for data in page['result']],
+            etags=etags if len(etags) == len(pages) else None,
+        )
+
+    async def _fetch_page(self, url: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        cached_page = self._pages.get(url)
+        headers = {} if cached_page is None else {hdrs.IF_NONE_MATCH: cached_page[0]}
+        async with self.session.get(url, headers=headers) as resp:
+            if cached_page is not None and resp.status == web.HTTPNotModified.status_code:
+                return cached_page
+            resp.raise_for_status()
+            return resp.headers.get(hdrs.ETAG), self._page_validator.load(await resp.json())
+
+
+async def fetch_switches_full_info(session: ClientSession, url: str, page_size: int) -> List[Any]:
+    """Fetch the full list of another its_on instance page by page following `next` links."""
+    full_info = await SwitchesFullInfoFetcher(session, url, page_size).fetch()
+    return full_info.result
@@ -30,7 +30,10 @@ def reverse(
     return str(request.url.join(path_url))
 
 
-def get_switch_badge_prefix_and_value(switch: RowProxy) -> tuple[str, str]:
+def get_switch_badge_prefix_and_value(switch: RowProxy | None) -> tuple[str, str]:
+    if switch is None:
+        return SWITCH_NOT_FOUND_SVG_BADGE_PREFIX, 'not found'
+
     value = switch.name
     if switch.deleted_at and switch.deleted_at <= utc_now():
         prefix = SWITCH_IS_HIDDEN_SVG_BADGE_PREFIX
@@ -47,19 +50,20 @@ def get_switch_badge_prefix_and_value(switch: RowProxy) -> tuple[str, str]:
 
 
 def get_switch_badge_svg(hostname: str, switch: RowProxy | None = None) -> str:
-    if switch is not None:
-        prefix, value = get_switch_badge_prefix_and_value(switch)
-    else:
-        prefix = SWITCH_NOT_FOUND_SVG_BADGE_PREFIX
-        value = 'not found'
+    prefix, value = get_switch_badge_prefix_and_value(switch)
+    return get_badge_svg(hostname, prefix, value)
+
 
-    badge = Badge(
+def get_badge_svg(hostname: str, prefix: str, value: str) -> str:
+    return make_badge(hostname, prefix, value).badge_svg_text
+
+
+def make_badge(hostname: str, prefix: str, value: str) -> Badge:
+    return Badge(
         label=f'{prefix} {hostname}', value=value,
         default_color=SVG_BADGE_BACKGROUND_COLOR,
     )
 
-    return badge.badge_svg_text
-
 
 def get_switch_markdown_badge(request: web.Request, switch: RowProxy) -> str:
     flag_url = reverse(request=request, router_name='switch_detail', params={'id': str(switch.id)})
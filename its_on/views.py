@@ -1,115 +1,506 @@
+import asyncio
 import functools
 import json
+import operator
 import textwrap
+import time
 
-from aiocache import cached
-from aiohttp import web
+from aiohttp import hdrs, web
 from aiohttp_apispec import request_schema, response_schema, docs
 from aiohttp_cors import CorsViewMixin
+from aiopg.sa import SAConnection
+from aiopg.sa.result import RowProxy
+import sqlalchemy as sa
 from its_on.config import settings
 from sqlalchemy.sql import Select
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from its_on.app_keys import db_key
-from its_on.admin.mixins import GetObjectMixin
-from its_on.cache import switch_list_cache_key_builder
+from its_on.app_keys import (
+    db_key,
+    group_switches_cache_key,
+    negative_cache_key,
+    snapshot_key,
+    svg_badge_cache_key,
+    svg_board_cache_key,
+    switch_events_key,
+    switch_full_list_cache_key,
+    switch_list_cache_key,
+    switch_loader_key,
+    switch_watch_hub_key,
+)
+from its_on.admin.mixins import BatchGetObjectMixin
+from its_on.badges import get_group_board_svg, get_switch_badge, make_svg_board_cache_key
+from its_on.cache import (
+    MISSING_GROUP_NAMESPACE,
+    MISSING_SWITCH_NAMESPACE,
+    SingleFlight,
+    log_failed_refresh,
+    make_negative_cache_key,
+    make_switch_full_list_cache_key,
+    make_switch_list_cache_key,
+)
+from its_on.events import SwitchEventSubscription
 from its_on.models import switches
+from its_on.payloads import CachedPayload, EncodedBody, make_cached_payload_response, make_payload_response
 from its_on.schemes import (
-    SwitchListRequestSchema, SwitchListResponseSchema, SwitchFullListResponseSchema,
+    SwitchBatchListRequestSchema,
+    SwitchBatchListResponseSchema,
+    SwitchEventsRequestSchema,
+    SwitchFullListRequestSchema,
+    SwitchFullListResponseSchema,
+    SwitchGroupBoardRequestSchema,
+    SwitchListRequestSchema,
+    SwitchListResponseSchema,
+    SwitchWatchRequestSchema,
+    SwitchWatchResponseSchema,
+)
+from its_on.snapshot import (
+    EMPTY_GROUP,
+    GroupSwitches,
+    SwitchRecord,
+    make_group_switches_cache_key,
+    select_switch_records,
 )
 from its_on.utils import DateTimeJSONEncoder, reverse
-from its_on.utils import get_switch_badge_svg, utc_now
+from its_on.utils import utc_now
+
+datetime_json_dumps = functools.partial(json.dumps, cls=DateTimeJSONEncoder)
+
+SSE_RETRY_INTERVAL = 1000  # milliseconds
+FULL_LIST_CURSOR_NAME = 'switches_full_info'
+
+EMPTY_SWITCH_LIST_PAYLOAD = CachedPayload({'count': 0, 'result': []})
 
 
 class SwitchListView(CorsViewMixin, web.View):
+    # Cache misses of the worker for the same key wait for one query.
+    single_flight = SingleFlight()
+
     @docs(
         summary='List of active flags for the group.',
-        description='Returns a list of active flags for the passed group.',
+        description=(
+            'Returns a list of active flags for the passed group. '
+            'Send `Accept: application/msgpack` to get it encoded with MessagePack.'
+        ),
+        produces=['application/json', 'application/msgpack'],
     )
     @request_schema(SwitchListRequestSchema(), locations=['query'])
     @response_schema(SwitchListResponseSchema(), code=200, description='Successful operation')
     async def get(self) -> web.Response:
-        data = await self.get_response_data()
-        return web.json_response(data)
+        payload = await self.get_response_data()
+        return make_cached_payload_response(self.request, payload)
 
-    @cached(ttl=settings.CACHE_TTL, key_builder=switch_list_cache_key_builder)
-    async def get_response_data(self) -> Dict:
-        objects = await self.load_objects()
+    async def get_response_data(self) -> CachedPayload:
+        group_name = self.request['validated_data']['group']
+        if self.is_missing_group(group_name):
+            # Neither the query nor the cache entry is needed for a group without switches.
+            return EMPTY_SWITCH_LIST_PAYLOAD
+
+        cache = self.request.app[switch_list_cache_key]
+        key = await self.make_cache_key(group_name)
+        load = functools.partial(self.load_payload, key)
+
+        entry = await cache.get(key)
+        if entry is None:
+            return await self.single_flight.do(key, load)
+
+        if cache.should_refresh(entry) and key not in self.single_flight:
+            # Serve the stale payload right away, later requests get the refreshed one.
+            self.single_flight.start(key, load).add_done_callback(functools.partial(log_failed_refresh, key))
+        return entry.payload
+
+    async def load_payload(self, key: str) -> CachedPayload:
+        cache = self.request.app[switch_list_cache_key]
+        started_at = time.monotonic()
+        generations = await cache.get_generations([key])
+        group = await self.get_group(self.request['validated_data']['group'])
+        if not group.records:
+            # The group is in the negative cache now, it is not worth a switch list entry.
+            return EMPTY_SWITCH_LIST_PAYLOAD
+
+        payload = CachedPayload(self.serialize_objects(self.filter_group_switches(group)))
+        await cache.multi_set([(key, payload)], load_time=time.monotonic() - started_at, generations=generations)
+        return payload
+
+    async def make_cache_key(self, group_name: str) -> str:
+        cache_keys = await self.make_cache_keys([group_name])
+        return cache_keys[group_name]
+
+    async def make_cache_keys(self, group_names: List[str]) -> Dict[str, str]:
+        validated_data = self.request['validated_data']
+        version = validated_data.get('version')
+        # Version buckets of all groups come from one lookup.
+        groups = {} if version is None else await self.get_groups(group_names)
+        return {
+            group_name: make_switch_list_cache_key(
+                group_name=group_name,
+                version=None if version is None else groups[group_name].get_version_bucket(version),
+                is_active=validated_data.get('is_active'),
+            )
+            for group_name in group_names
+        }
+
+    async def get_version_bucket(self, group_name: str) -> Optional[int]:
+        version = self.request['validated_data'].get('version')
+        if version is None:
+            return None
+        group = await self.get_group(group_name)
+        return group.get_version_bucket(version)
+
+    def serialize_objects(self, objects: List) -> Dict:
         data = [obj.name for obj in objects]
         return {
             'count': len(data),
             'result': data,
         }
 
-    async def load_objects(self) -> List:
+    def filter_group_switches(self, group: GroupSwitches) -> List[SwitchRecord]:
+        validated_data = self.request['validated_data']
+        return group.filter(
+            is_active=validated_data.get('is_active', True),
+            version=validated_data.get('version'),
+        )
+
+    async def get_group(self, group_name: str) -> GroupSwitches:
+        groups = await self.get_groups([group_name])
+        return groups[group_name]
+
+    async def get_groups(self, group_names: List[str]) -> Dict[str, GroupSwitches]:
+        """Switches of the groups, groups that are known to have none are not looked up."""
+        groups = {group_name: EMPTY_GROUP for group_name in group_names if self.is_missing_group(group_name)}
+
+        unknown_group_names = [group_name for group_name in group_names if group_name not in groups]
+        if unknown_group_names:
+            loaded_groups = await self.load_group_switches(unknown_group_names)
+            self.remember_missing_groups(loaded_groups)
+            groups.update(loaded_groups)
+        return groups
+
+    def is_missing_group(self, group_name: str) -> bool:
+        negative_cache = self.request.app[negative_cache_key]
+        return bool(negative_cache.get(make_negative_cache_key(MISSING_GROUP_NAMESPACE, group_name)))
+
+    def remember_missing_groups(self, groups: Dict[str, GroupSwitches]) -> None:
+        negative_cache = self.request.app[negative_cache_key]
+        for group_name, group in groups.items():
+            if not group.records:
+                negative_cache.set(make_negative_cache_key(MISSING_GROUP_NAMESPACE, group_name), True)
+
+    async def load_group_switches(self, group_names: List[str]) -> Dict[str, GroupSwitches]:
+        """Switches of the groups from the snapshot, or from the group cache of the worker without it."""
+        if snapshot_key not in self.request.app:
+            return await self.get_cached_groups(group_names)
+
+        snapshot = await self.request.app[snapshot_key].get_snapshot()
+        return {group_name: snapshot.get_group(group_name) for group_name in group_names}
+
+    async def get_cached_groups(self, group_names: List[str]) -> Dict[str, GroupSwitches]:
+        cache = self.request.app[group_switches_cache_key]
+        groups = {group_name: cache.get(make_group_switches_cache_key(group_name)) for group_name in group_names}
+
+        missing_group_names = [group_name for group_name, group in groups.items() if group is None]
+        if missing_group_names:
+            loaded_groups = await self.load_groups(missing_group_names)
+            for group_name, group in loaded_groups.items():
+                # Groups without switches go to the negative cache.
+                if group.records:
+                    cache.set(make_group_switches_cache_key(group_name), group)
+            groups.update(loaded_groups)
+        return groups
+
+    async def load_groups(self, group_names: List[str]) -> Dict[str, GroupSwitches]:
         async with self.request.app[db_key].acquire() as conn:
-            queryset = await self.get_queryset()
-            result = await conn.execute(queryset)
-            return await result.fetchall()
+            result = await conn.execute(self.get_queryset(group_names))
+            records = [SwitchRecord.from_row(row) for row in await result.fetchall()]
 
-    async def get_queryset(self) -> Select:
-        qs = switches.select().with_only_columns(switches.c.name).order_by(switches.c.name)
-        return await self.filter_queryset(qs)
+        return {
+            group_name: GroupSwitches(record for record in records if group_name in record.groups)
+            for group_name in group_names
+        }
 
-    def filter_active(self, queryset: Select, is_active: bool = True) -> Select:
-        return queryset.where(switches.c.is_active.is_(is_active))
+    def get_queryset(self, group_names: List[str]) -> Select:
+        # Every row of the groups that is not deleted yet: activity and version are filtered in memory.
+        queryset = self.filter_groups(select_switch_records(), group_names)
+        return self.filter_hidden(queryset)
 
-    def filter_group(self, queryset: Select, group_name: str) -> Select:
-        return queryset.where(switches.c.groups.any(group_name))
+    def filter_groups(self, queryset: Select, group_names: List[str]) -> Select:
+        # `groups && ARRAY[...]` can use the GIN index, `group = ANY(groups)` can not.
+        return queryset.where(switches.c.groups.overlap(group_names))
 
     def filter_hidden(self, queryset: Select) -> Select:
         return queryset.where(switches.c.deleted_at.is_(None) | (switches.c.deleted_at > utc_now()))
 
-    def filter_version(self, queryset: Select, version: Optional[str] = None) -> Select:
-        if version is not None:
-            queryset = queryset.where(switches.c.version <= version)
-        return queryset
 
-    async def filter_queryset(self, queryset: Select) -> Select:
+class SwitchWatchView(SwitchListView):
+    """Long-poll for changes of a group, served from the switch snapshot."""
+
+    @docs(
+        summary='Wait for changes of flags in the group.',
+        description=(
+            'Returns a list of active flags for the passed group as soon as the group revision '
+            'differs from the passed one. Responds with 304 when nothing changes within `timeout` seconds.'
+        ),
+    )
+    @request_schema(SwitchWatchRequestSchema(), locations=['query'])
+    @response_schema(SwitchWatchResponseSchema(), code=200, description='Successful operation')
+    async def get(self) -> web.Response:
         validated_data = self.request['validated_data']
+        revision = validated_data.get('revision')
+        snapshot = await self.request.app[snapshot_key].get_snapshot()
 
-        queryset = self.filter_group(queryset, validated_data['group'])
-        queryset = self.filter_active(queryset, validated_data.get('is_active', True))
-        queryset = self.filter_hidden(queryset)
-        queryset = self.filter_version(queryset, validated_data.get('version'))
+        if snapshot.get_group(validated_data['group']).revision == revision:
+            changed_snapshot = await self.request.app[switch_watch_hub_key].wait_for_change(
+                group_name=validated_data['group'],
+                revision=revision,
+                timeout=validated_data.get('timeout', settings.SWITCH_WATCH.DEFAULT_TIMEOUT),
+            )
+            if changed_snapshot is None:
+                response = web.Response(status=web.HTTPNotModified.status_code)
+                response.etag = revision
+                return response
+            snapshot = changed_snapshot
 
-        return queryset
+        return self.make_group_response(snapshot.get_group(validated_data['group']))
+
+    def make_group_response(self, group: GroupSwitches) -> web.Response:
+        data = self.serialize_objects(self.filter_group_switches(group))
+        response = web.json_response({'revision': group.revision, **data})
+        response.etag = group.revision
+        return response
+
+
+class SwitchEventsView(CorsViewMixin, web.View):
+    """Server-Sent Events stream of group changes, fed by the shared broadcaster of the worker."""
+
+    @docs(
+        summary='Stream of flag changes for the groups.',
+        description=textwrap.dedent(
+            """
+            Server-Sent Events stream. The current state of every passed group is sent first,
+            then a `switches` event with the list of active flags follows each change of a group.
+
+            Reconnecting clients may pass the `Last-Event-ID` header to receive only missed events.
+            Event ids are only known to the worker process that sent them, a reconnect served
+            by another process, or by a restarted one, gets the current state of every group again.
+            """,
+        ),
+        produces=['text/event-stream'],
+    )
+    @request_schema(SwitchEventsRequestSchema(), locations=['query'])
+    async def get(self) -> web.StreamResponse:
+        await self.request.app[snapshot_key].get_snapshot()
+        broadcaster = self.request.app[switch_events_key]
+        subscription = broadcaster.subscribe(
+            self.request['validated_data']['group'],
+            last_event_id=self.request.headers.get('Last-Event-ID'),
+        )
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        try:
+            await response.prepare(self.request)
+            await response.write(f'retry: {SSE_RETRY_INTERVAL}\n\n'.encode())
+            await self.stream_events(response, subscription)
+        finally:
+            broadcaster.unsubscribe(subscription)
+        return response
+
+    async def stream_events(self, response: web.StreamResponse, subscription: SwitchEventSubscription) -> None:
+        while True:
+            try:
+                event = await subscription.get(timeout=settings.SWITCH_EVENTS.KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                await response.write(b': keepalive\n\n')
+                continue
+
+            if event is None:
+                return
+            await response.write(event.encoded)
+
+
+class SwitchBatchListView(SwitchListView):
+    """Switch lists of several groups at once.
+
+    Shares cache entries with `SwitchListView`: hits for all groups are read with one
+    cache call and misses are loaded with one query.
+    """
+
+    @docs(
+        summary='Lists of active flags for several groups.',
+        description='Returns a list of active flags for each passed group.',
+    )
+    @request_schema(SwitchBatchListRequestSchema(), locations=['query'])
+    @response_schema(SwitchBatchListResponseSchema(), code=200, description='Successful operation')
+    async def get(self) -> web.Response:
+        data = await self.get_batch_response_data()
+        return web.json_response(data)
+
+    async def get_batch_response_data(self) -> Dict:
+        group_names = list(dict.fromkeys(self.request['validated_data']['group']))
+        payloads = {
+            group_name: EMPTY_SWITCH_LIST_PAYLOAD for group_name in group_names if self.is_missing_group(group_name)
+        }
+
+        known_group_names = [group_name for group_name in group_names if group_name not in payloads]
+        if known_group_names:
+            payloads.update(await self.get_groups_payloads(known_group_names))
+
+        return {
+            'result': {group_name: payloads[group_name].data for group_name in group_names},
+        }
+
+    async def get_groups_payloads(self, group_names: List[str]) -> Dict[str, CachedPayload]:
+        cache = self.request.app[switch_list_cache_key]
+        cache_keys = await self.make_cache_keys(group_names)
+
+        entries = dict(zip(group_names, await cache.multi_get(list(cache_keys.values()))))
+        payloads = {group_name: entry.payload for group_name, entry in entries.items() if entry is not None}
+
+        missing_group_names = [group_name for group_name, entry in entries.items() if entry is None]
+        if missing_group_names:
+            started_at = time.monotonic()
+            generations = await cache.get_generations([cache_keys[group_name] for group_name in missing_group_names])
+            loaded_payloads = await self.load_groups_payloads(missing_group_names)
+            await cache.multi_set(
+                (
+                    (cache_keys[group_name], payload) for group_name, payload in loaded_payloads.items()
+                    if payload is not EMPTY_SWITCH_LIST_PAYLOAD
+                ),
+                load_time=time.monotonic() - started_at,
+                generations=generations,
+            )
+            payloads.update(loaded_payloads)
+        return payloads
+
+    async def load_groups_payloads(self, group_names: List[str]) -> Dict[str, CachedPayload]:
+        groups = await self.get_groups(group_names)
+        return {
+            group_name: (
+                CachedPayload(self.serialize_objects(self.filter_group_switches(group)))
+                if group.records else EMPTY_SWITCH_LIST_PAYLOAD
+            )
+            for group_name, group in groups.items()
+        }
 
 
 class SwitchFullListView(CorsViewMixin, web.View):
+    single_flight = SingleFlight()
+
     @docs(
         summary='List of all active flags with full info.',
-        description='Returns a list of all active flags with all necessary info for recreation.',
+        description=textwrap.dedent(
+            """
+            Returns a list of all active flags with all necessary info for recreation.
+
+            With `stream=1` the list is read from the database in batches and sent as it is produced,
+            bypassing the cache.
+
+            With `limit` the list is split into pages ordered by flag id, `next` links the following page
+            and is null on the last one. Flags changed while the pages are read stay on their page.
+
+            With `Accept: application/msgpack` the list is encoded with MessagePack and timestamps are sent
+            as the timestamp extension type instead of ISO 8601 strings. Streams are always JSON.
+            """,
+        ),
+        produces=['application/json', 'application/msgpack'],
     )
+    @request_schema(SwitchFullListRequestSchema(), locations=['query'])
     @response_schema(SwitchFullListResponseSchema(), code=200, description='Successful operation')
-    async def get(self) -> web.Response:
-        data = await self.get_response_data()
-        return web.json_response(data, dumps=functools.partial(json.dumps, cls=DateTimeJSONEncoder))
+    async def get(self) -> web.StreamResponse:
+        validated_data = self.request['validated_data']
+        if validated_data.get('stream') and validated_data.get('limit') is None:
+            return await self.stream_response()
+
+        payload = await self.get_response_data()
+        return make_cached_payload_response(self.request, payload)
+
+    async def get_response_data(self) -> CachedPayload:
+        cache = self.request.app[switch_full_list_cache_key]
+        key = make_switch_full_list_cache_key(self.request)
+        payload = cache.get(key)
+        if payload is None:
+            payload = await self.single_flight.do(key, functools.partial(self.load_payload, key))
+        return payload
 
-    async def get_response_data(self) -> Dict:
+    async def load_payload(self, key: str) -> CachedPayload:
+        cache = self.request.app[switch_full_list_cache_key]
+        # A page loaded while a change cleared the cache is served but not kept.
+        generation = cache.generation
+        payload = await self.make_payload()
+        cache.set(key, payload, generation=generation)
+        return payload
+
+    async def make_payload(self) -> CachedPayload:
         objects = await self.load_objects()
-        data = [
-            {
-                'name': obj.name,
-                'is_active': obj.is_active,
-                'is_hidden': bool(obj.deleted_at),
-                'groups': obj.groups,
-                'version': obj.version,
-                'comment': obj.comment,
-                'ttl': obj.ttl,
-                'created_at': obj.created_at,
-                'updated_at': obj.updated_at,
-                'deleted_at': obj.deleted_at,
-                'flag_url': reverse(
-                    request=self.request,
-                    router_name='switch_detail',
-                    params={'id': str(obj.id)},
-                ),
-            }
-            for obj in objects
-        ]
+        limit = self.request['validated_data'].get('limit')
+        page = objects if limit is None else objects[:limit]
+
+        data: Dict[str, Any] = {'result': [self.serialize_object(obj) for obj in page]}
+        if limit is not None:
+            data['next'] = self.get_next_url(page[-1]) if len(objects) > limit else None
+        return CachedPayload(data, dumps=datetime_json_dumps)
+
+    def get_next_url(self, last_obj: RowProxy) -> str:
+        # Only the page is kept from the query: pages are cached without the other parameters.
+        return str(self.request.url.with_query(limit=self.request['validated_data']['limit'], after=last_obj.id))
+
+    async def stream_response(self) -> web.StreamResponse:
+        response = web.StreamResponse()
+        response.content_type = 'application/json'
+        response.charset = 'utf-8'
+        await response.prepare(self.request)
+
+        # Same bytes as `datetime_json_dumps({'result': data})` without holding all of it.
+        await response.write(b'{"result": [')
+        separator = ''
+        async with self.request.app[db_key].acquire() as conn:
+            async with conn.begin(readonly=True):
+                async for objects in self.iter_object_batches(conn):
+                    items = ', '.join(datetime_json_dumps(self.serialize_object(obj)) for obj in objects)
+                    await response.write(f'{separator}{items}'.encode())
+                    separator = ', '
+        await response.write(b']}')
+        await response.write_eof()
+        return response
+
+    async def iter_object_batches(self, conn: SAConnection) -> AsyncIterator[List]:
+        """Read the queryset through a server-side cursor, the connection has to be in a transaction."""
+        queryset = self.get_queryset()
+        compiled = queryset.compile(dialect=self.request.app[db_key].dialect)
+        await conn.execute(f'DECLARE {FULL_LIST_CURSOR_NAME} NO SCROLL CURSOR FOR {compiled}', compiled.params)
+
+        # Typed columns make the rows go through the same result processing as the queryset.
+        fetch = sa.text(
+            f'FETCH {settings.SWITCH_FULL_LIST.STREAM_BATCH_SIZE} FROM {FULL_LIST_CURSOR_NAME}',
+        ).columns(*queryset.selected_columns)
+        while True:
+            result = await conn.execute(fetch)
+            objects = await result.fetchall()
+            if not objects:
+                return
+            yield objects
+
+    def serialize_object(self, obj: RowProxy) -> Dict:
         return {
-            'result': data,
+            'id': obj.id,
+            'name': obj.name,
+            'is_active': obj.is_active,
+            'is_hidden': bool(obj.deleted_at),
+            'groups': obj.groups,
+            'version': obj.version,
+            'comment': obj.comment,
+            'ttl': obj.ttl,
+            'created_at': obj.created_at,
+            'updated_at': obj.updated_at,
+            'deleted_at': obj.deleted_at,
+            'flag_url': reverse(
+                request=self.request,
+                router_name='switch_detail',
+                params={'id': str(obj.id)},
+            ),
         }
 
     async def load_objects(self) -> List:
@@ -119,11 +510,24 @@ class SwitchFullListView(CorsViewMixin, web.View):
             return await result.fetchall()
 
     def get_queryset(self) -> Select:
-        return switches.select()
+        validated_data = self.request['validated_data']
+        queryset = switches.select().order_by(switches.c.id)
+        return self.paginate_queryset(queryset, validated_data.get('limit'), validated_data.get('after'))
+
+    def paginate_queryset(self, queryset: Select, limit: Optional[int], after: Optional[int]) -> Select:
+        # Keyset pagination: a page never shifts when other flags are created or deleted.
+        if after is not None:
+            queryset = queryset.where(switches.c.id > after)
+        if limit is not None:
+            # One extra row tells whether there is a next page.
+            queryset = queryset.limit(limit + 1)
+        return queryset
 
 
-class SwitchSvgBadgeView(CorsViewMixin, GetObjectMixin, web.View):
+class SwitchSvgBadgeView(CorsViewMixin, BatchGetObjectMixin, web.View):
     model = switches
+    loader_key = switch_loader_key
+    missing_objects_namespace = MISSING_SWITCH_NAMESPACE
 
     @docs(
         summary='SVG badge with actual flag information.',
@@ -151,6 +555,56 @@ class SwitchSvgBadgeView(CorsViewMixin, GetObjectMixin, web.View):
     async def get(self) -> web.Response:
         switch = await self.get_object(self.request)
 
-        svg_badge = get_switch_badge_svg(self.request.host, switch)
+        badge = get_switch_badge(self.request.app[svg_badge_cache_key], self.request.host, switch)
+
+        return make_svg_response(self.request, badge)
+
+
+class SwitchGroupBoardView(SwitchListView):
+    @docs(
+        summary='SVG board with all flags of the group.',
+        description=textwrap.dedent(
+            """
+            Returns one SVG image with the badges of all flags of the group, active and inactive,
+            one per line in the order of names. Flags are picked the same way as by `/api/v1/switch`.
+            """,
+        ),
+        produces=['image/svg+xml'],
+        responses={
+            200: {
+                'description': 'Successful operation',
+            },
+        },
+    )
+    @request_schema(SwitchGroupBoardRequestSchema(), locations=['query'])
+    async def get(self) -> web.Response:
+        board = await self.get_board()
+        return make_svg_response(self.request, board)
+
+    async def get_board(self) -> EncodedBody:
+        validated_data = self.request['validated_data']
+        cache = self.request.app[svg_board_cache_key]
+        key = make_svg_board_cache_key(
+            validated_data['group'], self.request.host, await self.get_version_bucket(validated_data['group']),
+        )
+
+        board = cache.get(key)
+        if board is None:
+            group = await self.get_group(validated_data['group'])
+            objects: List = self.filter_group_switches(group)
+            board = EncodedBody(get_group_board_svg(self.request.host, objects).encode())
+            # Boards of groups without switches would only push real boards out of the cache.
+            if group.records:
+                cache.set(key, board)
+        return board
+
+    def filter_group_switches(self, group: GroupSwitches) -> List[SwitchRecord]:
+        version = self.request['validated_data'].get('version')
+        records = group.filter(is_active=True, version=version) + group.filter(is_active=False, version=version)
+        return sorted(records, key=operator.attrgetter('sort_key'))
+
 
-        return web.Response(body=svg_badge, content_type='image/svg+xml')
+def make_svg_response(request: web.Request, body: EncodedBody) -> web.Response:
+    response = make_payload_response(request, body, content_type='image/svg+xml', charset=None)
+    response.headers[hdrs.CACHE_CONTROL] = f'public, max-age={settings.FLAG_SVG_BADGE.MAX_AGE}'
+    return response
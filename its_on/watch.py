@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, Iterable, Optional
+
+from aiohttp import web
+
+from its_on.app_keys import snapshot_key, switch_watch_hub_key
+from its_on.snapshot import SwitchSnapshot
+
+
+class _GroupWaiters:
+    __slots__ = ('condition', 'count')
+
+    def __init__(self) -> None:
+        self.condition = asyncio.Condition()
+        self.count = 0
+
+
+class SwitchWatchHub:
+    """Parks long-poll requests until the revision of their group changes.
+
+    Waiters of a group share one condition that is notified on snapshot swaps,
+    so idle waiters cost nothing but a parked coroutine.
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[SwitchSnapshot] = None
+        self._waiters: Dict[str, _GroupWaiters] = {}
+
+    async def handle_snapshot_swap(self, previous: Optional[SwitchSnapshot], snapshot: SwitchSnapshot) -> None:
+        self._snapshot = snapshot
+        await self.notify(snapshot.get_changed_groups(previous))
+
+    async def notify(self, group_names: Iterable[str]) -> None:
+        for group_name in group_names:
+            waiters = self._waiters.get(group_name)
+            if waiters is not None:
+                async with waiters.condition:
+                    waiters.condition.notify_all()
+
+    def is_changed(self, group_name: str, revision: str) -> bool:
+        return self._snapshot is not None and self._snapshot.get_group(group_name).revision != revision
+
+    async def wait_for_change(self, group_name: str, revision: str, timeout: float) -> Optional[SwitchSnapshot]:
+        """Return the snapshot in which the group differs from `revision`, or None on timeout."""
+        waiters = self._waiters.setdefault(group_name, _GroupWaiters())
+        waiters.count += 1
+        try:
+            async with waiters.condition:
+                await asyncio.wait_for(
+                    waiters.condition.wait_for(lambda: self.is_changed(group_name, revision)),
+                    timeout=timeout,
+                )
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters.count -= 1
+            if not waiters.count:
+                del self._waiters[group_name]
+        return self._snapshot
+
+
+def setup_watch(app: web.Application) -> None:
+    if snapshot_key not in app:
+        return
+
+    hub = SwitchWatchHub()
+    app[switch_watch_hub_key] = hub
+    app[snapshot_key].add_listener(hub.handle_snapshot_swap)
@@ -0,0 +1,8 @@
+"""Client of the its_on flag service.
+
+`ItsOnClient` only needs the standard library, `its_on_client.aio.AsyncItsOnClient` needs aiohttp.
+"""
+from its_on_client.client import ItsOnClient
+from its_on_client.snapshot import FlagSnapshot
+
+__all__ = ['FlagSnapshot', 'ItsOnClient']
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+import aiohttp
+
+from its_on_client.client import DEFAULT_REFRESH_INTERVAL, DEFAULT_TIMEOUT, load_saved_snapshot, save_snapshot
+from its_on_client.snapshot import EMPTY_SNAPSHOT, FlagSnapshot, make_switch_list_url, parse_switch_list
+
+logger = logging.getLogger(__name__)
+
+# The service can not be reached or its response is not a switch list.
+REFRESH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+class AsyncItsOnClient:
+    """asyncio flavour of `ItsOnClient`, refreshed by a background task.
+
+    Saving the snapshot to disk blocks the loop briefly, but only happens when a group has changed.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        groups: Iterable[str],
+        version: Optional[int] = None,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+        timeout: float = DEFAULT_TIMEOUT,
+        snapshot_path: Optional[str] = None,
+    ) -> None:
+        self.base_url = base_url
+        self.groups = list(groups)
+        self.version = version
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.snapshot_path = snapshot_path
+        self.snapshot = EMPTY_SNAPSHOT
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_active(self, name: str) -> bool:
+        return self.snapshot.is_active(name)
+
+    async def start(self) -> None:
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.snapshot = load_saved_snapshot(self.snapshot_path).select_groups(self.groups)
+        try:
+            await self.refresh()
+        except REFRESH_ERRORS:
+            logger.warning('Failed to load flags from %s, using the saved snapshot', self.base_url, exc_info=True)
+
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def refresh(self) -> None:
+        snapshot = self.snapshot
+        for group_name in self.groups:
+            snapshot = await self.refresh_group(snapshot, group_name)
+
+        if snapshot is not self.snapshot:
+            self.snapshot = snapshot
+            save_snapshot(snapshot, self.snapshot_path)
+
+    async def refresh_group(self, snapshot: FlagSnapshot, group_name: str) -> FlagSnapshot:
+        if self._session is None:
+            raise RuntimeError('The client is not started')
+
+        headers = {}
+        etag = snapshot.etags.get(group_name)
+        if etag is not None and group_name in snapshot.groups:
+            headers['If-None-Match'] = etag
+
+        url = make_switch_list_url(self.base_url, group_name, self.version)
+        async with self._session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return snapshot
+            response.raise_for_status()
+            names = parse_switch_list(await response.read())
+            return snapshot.replace_group(group_name, names, response.headers.get('ETag'))
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except REFRESH_ERRORS:
+                logger.warning('Failed to refresh flags from %s', self.base_url, exc_info=True)
+
+    async def __aenter__(self) -> AsyncItsOnClient:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.stop()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import http.client
+import logging
+import threading
+import urllib.error
+import urllib.request
+from typing import Iterable, Optional
+
+from its_on_client.snapshot import EMPTY_SNAPSHOT, FlagSnapshot, make_switch_list_url, parse_switch_list
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 30  # seconds
+DEFAULT_TIMEOUT = 2  # seconds
+# The service can not be reached or its response is not a switch list.
+REFRESH_ERRORS = (OSError, http.client.HTTPException, ValueError)
+
+
+class ItsOnClient:
+    """Flags of the groups kept in memory and refreshed by a background thread.
+
+    Refreshes are conditional requests, a group that has not changed costs a 304.
+    With `snapshot_path` the last good snapshot is saved to disk and used on start
+    when the service can not be reached. Flags are inactive until something is loaded.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        groups: Iterable[str],
+        version: Optional[int] = None,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+        timeout: float = DEFAULT_TIMEOUT,
+        snapshot_path: Optional[str] = None,
+    ) -> None:
+        self.base_url = base_url
+        self.groups = list(groups)
+        self.version = version
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.snapshot_path = snapshot_path
+        self.snapshot = EMPTY_SNAPSHOT
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_active(self, name: str) -> bool:
+        return self.snapshot.is_active(name)
+
+    def start(self) -> None:
+        self.snapshot = load_saved_snapshot(self.snapshot_path).select_groups(self.groups)
+        try:
+            self.refresh()
+        except REFRESH_ERRORS:
+            logger.warning('Failed to load flags from %s, using the saved snapshot', self.base_url, exc_info=True)
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._refresh_periodically, name='its-on-client', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def refresh(self) -> None:
+        snapshot = self.snapshot
+        for group_name in self.groups:
+            snapshot = self.refresh_group(snapshot, group_name)
+
+        if snapshot is not self.snapshot:
+            self.snapshot = snapshot
+            save_snapshot(snapshot, self.snapshot_path)
+
+    def refresh_group(self, snapshot: FlagSnapshot, group_name: str) -> FlagSnapshot:
+        request = urllib.request.Request(make_switch_list_url(self.base_url, group_name, self.version))
+        etag = snapshot.etags.get(group_name)
+        if etag is not None and group_name in snapshot.groups:
+            request.add_header('If-None-Match', etag)
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return snapshot.replace_group(group_name, parse_switch_list(response.read()), response.headers['ETag'])
+        except urllib.error.HTTPError as exc:
+            if exc.code == 304:
+                return snapshot
+            raise
+
+    def _refresh_periodically(self) -> None:
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except REFRESH_ERRORS:
+                logger.warning('Failed to refresh flags from %s', self.base_url, exc_info=True)
+
+    def __enter__(self) -> ItsOnClient:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def load_saved_snapshot(path: Optional[str]) -> FlagSnapshot:
+    if path is None:
+        return EMPTY_SNAPSHOT
+    try:
+        return FlagSnapshot.load(path)
+    except FileNotFoundError:
+        return EMPTY_SNAPSHOT
+    except (OSError, ValueError, KeyError):
+        logger.warning('Ignoring unreadable flag snapshot %s', path, exc_info=True)
+        return EMPTY_SNAPSHOT
+
+
+def save_snapshot(snapshot: FlagSnapshot, path: Optional[str]) -> None:
+    if path is None:
+        return
+    try:
+        snapshot.dump(path)
+    except OSError:
+        logger.warning('Failed to save flag snapshot to %s', path, exc_info=True)
@@ -0,0 +1,144 @@
+"""Switch snapshot shared with processes on the same host through a memory-mapped file.
+
+The file is written by its_on and replaced atomically. Layout, little-endian:
+
+    header   magic and record count
+    records  fixed-size, sorted by key: key offset, key length, flags, version, deleted_at
+    keys     UTF-8 `<group>\\0<name>` of every record
+
+Lookups binary search the records in place, nothing is parsed up front.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+MAGIC = b'ITSONSS1'
+HEADER = struct.Struct('<8sI4x')
+RECORD = struct.Struct('<IHBxqd')
+
+FLAG_ACTIVE = 1
+FLAG_HAS_VERSION = 2
+
+DEFAULT_CHECK_INTERVAL = 1  # seconds
+
+
+class SwitchState(NamedTuple):
+    is_active: bool
+    version: Optional[int]
+    deleted_at: Optional[float]  # unix time the switch is hidden at
+
+    def is_visible(self, now: float) -> bool:
+        return self.deleted_at is None or self.deleted_at > now
+
+    def matches_version(self, version: Optional[int]) -> bool:
+        # The same rule as `version <= :version` of the switch list: NULL versions never match.
+        return version is None or (self.version is not None and self.version <= version)
+
+
+def make_key(group_name: str, name: str) -> bytes:
+    return f'{group_name}\0{name}'.encode()
+
+
+def pack_snapshot(entries: Iterable[Tuple[str, str, SwitchState]]) -> bytes:
+    keyed_states = sorted((make_key(group_name, name), state) for group_name, name, state in entries)
+    keys_offset = HEADER.size + RECORD.size * len(keyed_states)
+
+    records = []
+    key_offset = keys_offset
+    for key, state in keyed_states:
+        flags = (FLAG_ACTIVE if state.is_active else 0) | (FLAG_HAS_VERSION if state.version is not None else 0)
+        deleted_at = 0.0 if state.deleted_at is None else state.deleted_at
+        records.append(RECORD.pack(key_offset, len(key), flags, state.version or 0, deleted_at))
+        key_offset += len(key)
+
+    header = HEADER.pack(MAGIC, len(keyed_states))
+    return b''.join([header, *records, *(key for key, _ in keyed_states)])
+
+
+def write_snapshot_file(path: str, data: bytes) -> None:
+    """Replace the file atomically, readers keep the mapping of the previous one."""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(data)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temp_path, path)
+
+
+class MappedSnapshot:
+    """One version of the snapshot file, mapped read-only."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as snapshot_file:
+            self.stat = os.fstat(snapshot_file.fileno())
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f'{path} is not an its_on snapshot file')
+
+    def lookup(self, group_name: str, name: str) -> Optional[SwitchState]:
+        key = make_key(group_name, name)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, flags, version, deleted_at = RECORD.unpack_from(
+                self._map, HEADER.size + RECORD.size * middle,
+            )
+            middle_key = self._map[key_offset:key_offset + key_length]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return SwitchState(
+                    is_active=bool(flags & FLAG_ACTIVE),
+                    version=version if flags & FLAG_HAS_VERSION else None,
+                    deleted_at=deleted_at or None,
+                )
+        return None
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class SnapshotFileReader:
+    """Flag lookups in the snapshot file, following its atomic replacements.
+
+    The file is checked for a replacement at most once per `check_interval` seconds.
+    """
+
+    def __init__(self, path: str, check_interval: float = DEFAULT_CHECK_INTERVAL) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = MappedSnapshot(path)
+        self._checked_at = time.monotonic()
+
+    def is_active(self, group_name: str, name: str, version: Optional[int] = None) -> bool:
+        """Whether `/api/v1/switch?group=<group_name>&version=<version>` would list the flag."""
+        state = self.lookup(group_name, name)
+        return (
+            state is not None and state.is_active and state.is_visible(time.time())
+            and state.matches_version(version)
+        )
+
+    def lookup(self, group_name: str, name: str) -> Optional[SwitchState]:
+        return self._get_snapshot().lookup(group_name, name)
+
+    def close(self) -> None:
+        self._snapshot.close()
+
+    def _get_snapshot(self) -> MappedSnapshot:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            stat = os.stat(self.path)
+            if (stat.st_ino, stat.st_mtime_ns) != (self._snapshot.stat.st_ino, self._snapshot.stat.st_mtime_ns):
+                # The previous mapping is unmapped once no thread reads from it any more.
+                self._snapshot = MappedSnapshot(self.path)
+        return self._snapshot
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional
+from urllib.parse import urlencode
+
+SWITCH_LIST_PATH = '/api/v1/switch'
+
+
+class FlagSnapshot:
+    """Active flags of the configured groups with the ETags they were fetched with.
+
+    Immutable, a refresh builds a new snapshot and swaps it in.
+    """
+
+    __slots__ = ('groups', 'etags', 'active_flags')
+
+    def __init__(self, groups: Mapping[str, FrozenSet[str]], etags: Optional[Mapping[str, str]] = None) -> None:
+        self.groups: Dict[str, FrozenSet[str]] = dict(groups)
+        self.etags: Dict[str, str] = dict(etags or {})
+        self.active_flags: FrozenSet[str] = frozenset().union(*self.groups.values())
+
+    @classmethod
+    def load(cls, path: str) -> FlagSnapshot:
+        with open(path) as snapshot_file:
+            data = json.load(snapshot_file)
+        return cls({group_name: frozenset(names) for group_name, names in data['groups'].items()}, data['etags'])
+
+    def is_active(self, name: str) -> bool:
+        return name in self.active_flags
+
+    def replace_group(self, group_name: str, names: Iterable[str], etag: Optional[str]) -> FlagSnapshot:
+        etags = {name: value for name, value in self.etags.items() if name != group_name}
+        if etag:
+            etags[group_name] = etag
+        return FlagSnapshot({**self.groups, group_name: frozenset(names)}, etags)
+
+    def select_groups(self, group_names: Iterable[str]) -> FlagSnapshot:
+        group_names = set(group_names)
+        return FlagSnapshot(
+            {name: names for name, names in self.groups.items() if name in group_names},
+            {name: etag for name, etag in self.etags.items() if name in group_names},
+        )
+
+    def dump(self, path: str) -> None:
+        """Write the snapshot to the file, readers never see a partially written one."""
+        data = {
+            'groups': {group_name: sorted(names) for group_name, names in self.groups.items()},
+            'etags': self.etags,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as snapshot_file:
+            json.dump(data, snapshot_file)
+        os.replace(snapshot_file.name, path)
+
+
+EMPTY_SNAPSHOT = FlagSnapshot({})
+
+
+def make_switch_list_url(base_url: str, group_name: str, version: Optional[int] = None) -> str:
+    query: Dict[str, object] = {'group': group_name}
+    if version is not None:
+        query['version'] = version
+    return f'{base_url.rstrip("/")}{SWITCH_LIST_PATH}?{urlencode(query)}'
+
+
+def parse_switch_list(body: bytes) -> FrozenSet[str]:
+    """Names of the switches in a switch list response, ValueError when the body is not one."""
+    try:
+        return frozenset(json.loads(body)['result'])
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f'Not a switch list: {body[:100]!r}') from exc
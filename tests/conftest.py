@@ -30,6 +30,13 @@ async def client(aiohttp_client: Callable) -> None:
     return await aiohttp_client(app)
 
 
+@pytest.fixture()
+def switch_snapshot_disabled() -> Generator:
+    settings.set('SWITCH_SNAPSHOT__IS_ENABLED', False)
+    yield
+    settings.set('SWITCH_SNAPSHOT__IS_ENABLED', True)
+
+
 @pytest.fixture()
 def db_conn_acquirer(client) -> Callable:
     return client.server.app[db_key].acquire
@@ -162,6 +169,7 @@ def asserted_switch_full_info_data(client):
         return {
             'result': [
                 {
+                    'id': switch.id,
                     'name': switch.name,
                     'is_active': switch.is_active,
                     'is_hidden': switch.is_hidden,
@@ -1,12 +1,15 @@
 import datetime
 
 import pytest
+from aiohttp import web
 from aiohttp.test_utils import make_mocked_request
 from aiohttp.web_exceptions import HTTPOk
 from freezegun import freeze_time
+from yarl import URL
 from sqlalchemy import desc, func, select
 
 from auth.models import users
+from its_on.admin.views.switches import SwitchesCopyAdminView
 from its_on.models import switch_history, switches
 from its_on.utils import get_switch_badge_svg, get_switch_markdown_badge, local_timezone, utc_now
 
@@ -291,6 +294,22 @@ async def test_switches_copy_new_switch(client, db_conn_acquirer):
     assert new_switch.name == 'extremely_new_switch'
 
 
+@pytest.mark.usefixtures('setup_tables_and_data', 'login')
+async def test_switches_copy_publishes_one_change(
+    client, get_switches_data_mocked_existing_switch, get_switches_data_mocked_new_switch, mocker,
+):
+    get_switches_data_mocked_new_switch.return_value['result'].extend(
+        get_switches_data_mocked_existing_switch.return_value['result'],
+    )
+    publish_switch_change = mocker.patch('its_on.change_feed.publish_switch_change')
+
+    await client.post('/zbs/switches/copy?update_existing=true')
+
+    assert publish_switch_change.call_count == 1
+    change = publish_switch_change.call_args[0][1]
+    assert change.groups == frozenset(['soft_delete'])
+
+
 @pytest.mark.parametrize('switch_name', ['switch', ' switch', 'switch ', ' switch '])
 @pytest.mark.usefixtures('setup_tables_and_data')
 async def test_switch_strip_spaces(
@@ -327,3 +346,26 @@ async def test_switch_detail_svg_badge(client, switch):
     assert 'md-badge' in content
     assert expected_svg_badge in content
     assert expected_markdown_badge in content
+
+
+async def test_switches_copy_follows_next_links(aiohttp_server, monkeypatch):
+    pages = {
+        None: {'result': [{'name': 'switch1'}], 'next': '/api/v1/switches_full_info?limit=1&after=1'},
+        '1': {'result': [{'name': 'switch2'}], 'next': None},
+    }
+
+    async def full_info(request):
+        assert request.query['limit'] == '1'
+        page = dict(pages[request.query.get('after')])
+        page['next'] = page['next'] and str(request.url.join(URL(page['next'])))
+        return web.json_response(page)
+
+    app = web.Application()
+    app.router.add_get('/api/v1/switches_full_info', full_info)
+    server = await aiohttp_server(app)
+    monkeypatch.setattr(settings, 'SYNC_FROM_ITS_ON_URL', str(server.make_url('/api/v1/switches_full_info')))
+    monkeypatch.setattr(settings, 'SYNC_FROM_ITS_ON_PAGE_SIZE', 1)
+
+    switches_data = await SwitchesCopyAdminView._get_switches_data()
+
+    assert switches_data == {'result': [{'name': 'switch1'}, {'name': 'switch2'}]}
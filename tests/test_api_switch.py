@@ -1,6 +1,7 @@
 import datetime
 
 import pytest
+from yarl import URL
 
 from its_on.utils import get_switch_badge_svg
 
@@ -50,6 +51,106 @@ async def test_switch_filter_by_group(group, expected_result, setup_tables_and_d
     assert await response.json() == expected_result
 
 
+@pytest.mark.parametrize('query,expected_result', [
+    ('group=group1', {'count': 3, 'result': ['switch1', 'switch2', 'switch4']}),
+    ('group=group1&is_active=false', {'count': 1, 'result': ['switch3']}),
+    ('group=group1&version=4', {'count': 1, 'result': ['switch4']}),
+])
+async def test_switch_without_snapshot(
+    query, expected_result, switch_snapshot_disabled, setup_tables_and_data, client,
+):
+    response = await client.get(f'/api/v1/switch?{query}')
+
+    assert response.status == 200
+    assert await response.json() == expected_result
+
+
+SWITCH_BATCH_CASES = [
+    (
+        'group=group1&group=group2&group=unknown',
+        {
+            'group1': {'count': 3, 'result': ['switch1', 'switch2', 'switch4']},
+            'group2': {'count': 2, 'result': ['switch1', 'switch5']},
+            'unknown': {'count': 0, 'result': []},
+        },
+    ),
+    (
+        'group=group1&group=group3&version=4',
+        {
+            'group1': {'count': 1, 'result': ['switch4']},
+            'group3': {'count': 1, 'result': ['switch4']},
+        },
+    ),
+    (
+        'group=group1&is_active=false',
+        {
+            'group1': {'count': 1, 'result': ['switch3']},
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize('query,expected_result', SWITCH_BATCH_CASES)
+async def test_switch_batch(query, expected_result, setup_tables_and_data, client):
+    response = await client.get(f'/api/v1/switch/batch?{query}')
+
+    assert response.status == 200
+    assert await response.json() == {'result': expected_result}
+
+
+@pytest.mark.parametrize('query,expected_result', SWITCH_BATCH_CASES)
+async def test_switch_batch_without_snapshot(
+    query, expected_result, switch_snapshot_disabled, setup_tables_and_data, client,
+):
+    response = await client.get(f'/api/v1/switch/batch?{query}')
+
+    assert response.status == 200
+    assert await response.json() == {'result': expected_result}
+
+
+async def test_switch_batch_without_params(setup_tables_and_data, client):
+    response = await client.get('/api/v1/switch/batch')
+
+    assert response.status == 422
+    assert await response.json() == {'group': ['Missing data for required field.']}
+
+
+@pytest.mark.parametrize('path', ['/api/v1/switch?group=group1', '/api/v1/switches_full_info'])
+async def test_switch_not_modified(path, setup_tables_and_data, client):
+    response = await client.get(path)
+    etag = response.headers['ETag']
+
+    not_modified_response = await client.get(path, headers={'If-None-Match': etag})
+
+    assert not_modified_response.status == 304
+    assert not_modified_response.headers['ETag'] == etag
+    assert await not_modified_response.read() == b''
+
+
+async def test_switch_etag_changes_with_content(setup_tables_and_data, client):
+    group1_response = await client.get('/api/v1/switch?group=group1')
+    group2_response = await client.get(
+        '/api/v1/switch?group=group2', headers={'If-None-Match': group1_response.headers['ETag']},
+    )
+
+    assert group2_response.status == 200
+    assert group2_response.headers['ETag'] != group1_response.headers['ETag']
+
+
+async def test_switch_watch(setup_tables_and_data, client):
+    response = await client.get('/api/v1/switch/watch?group=group1')
+    revision = (await response.json())['revision']
+
+    not_modified_response = await client.get(f'/api/v1/switch/watch?group=group1&revision={revision}&timeout=1')
+
+    assert response.status == 200
+    assert await response.json() == {
+        'revision': revision, 'count': 3, 'result': ['switch1', 'switch2', 'switch4'],
+    }
+    assert not_modified_response.status == 304
+    assert not_modified_response.headers['ETag'] == f'"{revision}"'
+
+
 async def test_switch_cors(client):
     response = await client.get(
         '/api/v1/switch?group=group1',
@@ -92,6 +193,44 @@ async def test_switches_full_info(
     assert await response.json() == asserted_switch_full_info_data(all_switches)
 
 
+async def test_switches_full_info_pages(
+    switches_factory, client, asserted_switch_full_info_data,
+):
+    all_switches = await switches_factory(batch_size=5)
+    expected_result = asserted_switch_full_info_data(all_switches)['result']
+
+    result = []
+    url = '/api/v1/switches_full_info?limit=2'
+    while url:
+        response = await client.get(url)
+        assert response.status == 200
+        page = await response.json()
+        result.extend(page['result'])
+        url = page['next'] and URL(page['next']).path_qs
+
+    assert result == expected_result
+
+
+async def test_switches_full_info_last_page(switches_factory, client):
+    await switches_factory(batch_size=2)
+    response = await client.get('/api/v1/switches_full_info?limit=2')
+
+    assert (await response.json())['next'] is None
+
+
+async def test_switches_full_info_stream(
+    switches_factory, client, asserted_switch_full_info_data,
+):
+    all_switches = await switches_factory(batch_size=5)
+    response = await client.get('/api/v1/switches_full_info')
+    stream_response = await client.get('/api/v1/switches_full_info?stream=1')
+
+    assert stream_response.status == 200
+    assert stream_response.headers['Transfer-Encoding'] == 'chunked'
+    assert await stream_response.read() == await response.read()
+    assert await stream_response.json() == asserted_switch_full_info_data(all_switches)
+
+
 @pytest.mark.freeze_time(datetime.datetime(2020, 5, 1, tzinfo=datetime.timezone.utc))
 async def test_switches_deleted_at(
     switch_factory, client, asserted_switch_full_info_data,
@@ -146,3 +285,16 @@ async def test_switch_svg_badge_view(
 
     assert response.status == 200
     assert await response.text() == expected_badge_svg
+    assert response.headers['Cache-Control'] == 'public, max-age=60'
+    assert response.headers['ETag']
+
+
+@pytest.mark.usefixtures('setup_tables_and_data')
+async def test_switch_group_board_view(client):
+    response = await client.get('/api/v1/switch/board', params={'group': 'group1'})
+
+    assert response.status == 200
+    assert response.headers['Content-Type'] == 'image/svg+xml'
+    board = await response.text()
+    for flag_name in ['switch1', 'switch2', 'switch3', 'switch4']:
+        assert flag_name in board
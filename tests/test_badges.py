@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from its_on.badges import (
+    get_group_board_svg,
+    get_switch_badge,
+    invalidate_svg_badge_cache,
+    invalidate_svg_board_cache,
+    make_svg_board_cache_key,
+)
+from its_on.cache import LRUCache
+from its_on.change_feed import SwitchChange
+from its_on.utils import get_badge_svg, get_switch_badge_svg
+
+
+def make_switch(name='switch1', is_active=True):
+    return SimpleNamespace(name=name, is_active=is_active, deleted_at=None)
+
+
+@pytest.mark.usefixtures('badge_mask_id_patch')
+def test_get_switch_badge_renders_once():
+    cache = LRUCache(max_size=10, ttl=60)
+    switch = make_switch()
+
+    with patch('its_on.badges.get_badge_svg', wraps=get_badge_svg) as render:
+        first_badge = get_switch_badge(cache, 'flags.local', switch)
+        second_badge = get_switch_badge(cache, 'flags.local', make_switch())
+
+    assert render.call_count == 1
+    assert second_badge is first_badge
+    assert first_badge.body.decode() == get_switch_badge_svg('flags.local', switch)
+
+
+def test_get_switch_badge_keys_by_host_and_state():
+    cache = LRUCache(max_size=10, ttl=60)
+
+    get_switch_badge(cache, 'flags.local', make_switch())
+    get_switch_badge(cache, 'flags.example.com', make_switch())
+    get_switch_badge(cache, 'flags.local', make_switch(is_active=False))
+    get_switch_badge(cache, 'flags.local', None)
+
+    assert len(cache) == 4
+
+
+async def test_invalidate_svg_badge_cache():
+    cache = LRUCache(max_size=10, ttl=60)
+    get_switch_badge(cache, 'flags.local', make_switch())
+
+    await invalidate_svg_badge_cache(cache, SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])))
+
+    assert len(cache) == 0
+
+
+def test_get_group_board_svg():
+    board = get_group_board_svg('flags.local', [make_switch('switch1'), make_switch('switch2', is_active=False)])
+
+    assert board.startswith('<svg xmlns="http://www.w3.org/2000/svg"')
+    assert board.count('<svg') == 3
+    assert '<?xml' not in board
+    assert 'height="48"' in board
+    assert 'switch1' in board
+    assert 'switch2' in board
+
+
+def test_get_group_board_svg_for_empty_group():
+    board = get_group_board_svg('flags.local', [])
+
+    assert 'no flags' in board
+
+
+async def test_invalidate_svg_board_cache_evicts_changed_groups():
+    cache = LRUCache(max_size=10, ttl=60)
+    for group_name in ['group1', 'group2']:
+        cache.set(make_svg_board_cache_key(group_name, 'flags.local', version=None), group_name)
+
+    await invalidate_svg_board_cache(cache, SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])))
+
+    assert cache.get(make_svg_board_cache_key('group1', 'flags.local', version=None)) is None
+    assert cache.get(make_svg_board_cache_key('group2', 'flags.local', version=None)) == 'group2'
+
+    await invalidate_svg_board_cache(cache, SwitchChange.everything())
+
+    assert len(cache) == 0
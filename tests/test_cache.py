@@ -0,0 +1,355 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from aiocache import SimpleMemoryCache
+
+from its_on.cache import (
+    MISSING_GROUP_NAMESPACE,
+    MISSING_SWITCH_NAMESPACE,
+    CacheEntry,
+    LRUCache,
+    SingleFlight,
+    SwitchListCache,
+    invalidate_negative_cache,
+    invalidate_switch_list_cache,
+    make_negative_cache_key,
+    make_switch_full_list_cache_key,
+    make_switch_list_cache_key,
+)
+from its_on.change_feed import SwitchChange
+from its_on.payloads import CachedPayload
+
+
+def make_switch_list_cache(ttl=60, local_max_size=10):
+    return SwitchListCache(LRUCache(max_size=local_max_size, ttl=ttl), shared=SimpleMemoryCache(), ttl=ttl)
+
+
+def make_payload(*names):
+    return CachedPayload({'count': len(names), 'result': list(names)})
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats.evictions == 1
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+
+    with patch('its_on.cache.time.monotonic', return_value=float('inf')):
+        assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_clear_namespace():
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.set('switch_list:group1:None__None', 1)
+    cache.set('switch_list:group10:None__None', 2)
+
+    cache.clear('switch_list:group1')
+
+    assert cache.get('switch_list:group1:None__None') is None
+    assert cache.get('switch_list:group10:None__None') == 2
+
+
+def test_cache_entry_round_trip():
+    entry = CacheEntry(make_payload('switch1'), fresh_until=1700000000.5, load_time=0.01, generation='1.2')
+
+    with patch('its_on.payloads.make_etag') as make_etag:
+        loaded_entry = CacheEntry.loads(entry.dumps())
+
+    make_etag.assert_not_called()
+    assert loaded_entry.payload.etag == entry.payload.etag
+    assert loaded_entry.payload.body == entry.payload.body
+    assert loaded_entry.payload.data == entry.payload.data
+    assert loaded_entry[1:] == entry[1:]
+
+
+@pytest.mark.parametrize('now,load_time,beta,random_value,expected_result', [
+    (90, 0, 1, 0.5, False),
+    (100, 0, 1, 0.5, True),
+    (90, 1, 1, 0.5, False),
+    (90, 1, 1, 0.99999, True),
+    (99, 1, 0, 0.99999, False),
+])
+def test_cache_entry_should_refresh(now, load_time, beta, random_value, expected_result):
+    entry = CacheEntry(make_payload(), fresh_until=100, load_time=load_time)
+
+    with patch('its_on.cache.random.random', return_value=random_value):
+        assert entry.should_refresh(beta, now=now) is expected_result
+
+
+async def test_switch_list_cache_keeps_stale_entries_until_hard_ttl():
+    cache = SwitchListCache(LRUCache(max_size=10, ttl=90), shared=SimpleMemoryCache(), ttl=60, stale_ttl=30)
+
+    with patch('its_on.cache.time.time', return_value=1000):
+        await cache.set('key', make_payload('switch1'), load_time=0.5)
+
+    entry = await cache.get('key')
+    assert entry.fresh_until == 1060
+    assert entry.load_time == 0.5
+    assert cache.local.ttl == 90
+
+
+async def test_switch_list_cache_promotes_shared_hits():
+    cache = make_switch_list_cache()
+    other_worker_cache = SwitchListCache(LRUCache(max_size=10, ttl=60), shared=cache.shared, ttl=60)
+    key = make_switch_list_cache_key('group1', version=None, is_active=None)
+    generations = await other_worker_cache.get_generations([key])
+    await other_worker_cache.multi_set([(key, make_payload('switch1'))], generations=generations)
+
+    first_entry = await cache.get(key)
+    second_entry = await cache.get(key)
+
+    assert first_entry.payload.data == {'count': 1, 'result': ['switch1']}
+    assert second_entry is first_entry
+    assert cache.stats == {
+        'local': {'hits': 1, 'misses': 1, 'evictions': 0, 'errors': 0},
+        'shared': {'hits': 1, 'misses': 0, 'evictions': 0, 'errors': 0},
+    }
+
+
+async def test_switch_list_cache_misses_both_tiers():
+    cache = make_switch_list_cache()
+
+    assert await cache.multi_get(['key1', 'key2']) == [None, None]
+    assert cache.stats['local']['misses'] == 2
+    assert cache.stats['shared']['misses'] == 2
+
+
+async def test_switch_list_cache_disabled_without_ttl():
+    cache = make_switch_list_cache(ttl=0)
+    await cache.set('key', make_payload('switch1'))
+
+    assert await cache.get('key') is None
+    assert len(cache.local) == 0
+
+
+async def test_switch_list_cache_survives_shared_failures():
+    cache = make_switch_list_cache()
+    await cache.set('key', make_payload('switch1'))
+    cache.local.clear()
+
+    with patch.object(cache.shared, 'multi_get', side_effect=ConnectionError):
+        assert await cache.get('key') is None
+    assert cache.stats['shared']['errors'] == 1
+
+
+async def test_switch_list_cache_without_shared_tier():
+    cache = SwitchListCache(LRUCache(max_size=10, ttl=60), shared=None, ttl=60)
+    key = make_switch_list_cache_key('group1', version=None, is_active=None)
+    generations = await cache.get_generations([key])
+    await cache.multi_set([(key, make_payload('switch1'))], generations=generations)
+
+    assert generations.shared is None
+    assert (await cache.get(key)).payload.data == {'count': 1, 'result': ['switch1']}
+
+    await invalidate_switch_list_cache(cache, SwitchChange.everything())
+
+    assert await cache.get(key) is None
+    assert cache.stats['shared'] == {'hits': 0, 'misses': 0, 'evictions': 0, 'errors': 0}
+
+
+async def test_switch_list_cache_skips_shared_tier_after_failure(caplog):
+    cache = SwitchListCache(
+        LRUCache(max_size=10, ttl=60), shared=SimpleMemoryCache(), ttl=60, shared_retry_delay=60,
+    )
+
+    with patch.object(cache.shared, 'multi_get', side_effect=ConnectionError) as multi_get:
+        assert await cache.multi_get(['key1']) == [None]
+        assert await cache.multi_get(['key2']) == [None]
+        assert (await cache.get_generations(['key2'])).shared is None
+
+    assert multi_get.call_count == 1
+    assert cache.stats['shared']['errors'] == 1
+    assert len(caplog.records) == 1
+
+
+async def test_switch_list_cache_skips_entries_of_older_generations():
+    cache = make_switch_list_cache()
+    other_worker_cache = SwitchListCache(LRUCache(max_size=10, ttl=60), shared=cache.shared, ttl=60)
+    key = make_switch_list_cache_key('group1', version=None, is_active=None)
+    # The load started before the change was handled.
+    generations = await cache.get_generations([key])
+    await other_worker_cache.clear(namespace='switch_list:group1')
+    await cache.multi_set([(key, make_payload('switch1'))], generations=generations)
+    cache.local.clear()
+
+    assert await cache.get(key) is None
+    assert (await cache.get_generations([key])).shared == {key: '0.0.1'}
+
+
+async def test_switch_list_cache_skips_local_entries_loaded_while_cleared():
+    cache = SwitchListCache(LRUCache(max_size=10, ttl=60), shared=None, ttl=60)
+    key = make_switch_list_cache_key('group1', version=None, is_active=None)
+    # The load started before the change was handled.
+    generations = await cache.get_generations([key])
+    await invalidate_switch_list_cache(cache, SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])))
+    await cache.multi_set([(key, make_payload('old'))], generations=generations)
+
+    assert await cache.get(key) is None
+
+
+async def test_switch_list_cache_does_not_promote_entries_while_clearing():
+    cache = make_switch_list_cache()
+    key = make_switch_list_cache_key('group1', version=None, is_active=None)
+    await cache.multi_set([(key, make_payload('old'))], generations=await cache.get_generations([key]))
+    cache.local.clear()
+    increment = cache.shared.increment
+    incremented = asyncio.Event()
+
+    async def slow_increment(*args, **kwargs):
+        await incremented.wait()
+        return await increment(*args, **kwargs)
+
+    with patch.object(cache.shared, 'increment', side_effect=slow_increment):
+        clearing = asyncio.ensure_future(cache.clear(namespace='switch_list:group1'))
+        await asyncio.sleep(0)
+        # A request served while the change is handled still gets the old list.
+        assert (await cache.get(key)).payload.data['result'] == ['old']
+        incremented.set()
+        await clearing
+
+    assert await cache.get(key) is None
+
+
+async def test_invalidate_switch_list_cache_evicts_everything():
+    cache = make_switch_list_cache()
+    keys = [make_switch_list_cache_key(group_name, version=None, is_active=None) for group_name in ['group1', 'group2']]
+    generations = await cache.get_generations(keys)
+    await cache.multi_set(((key, make_payload('switch1')) for key in keys), generations=generations)
+
+    await invalidate_switch_list_cache(cache, SwitchChange.everything())
+
+    cache.local.clear()
+    payloads = await cache.multi_get(keys)
+    assert payloads == [None, None]
+
+
+async def test_invalidate_switch_list_cache_keeps_shared_tier_on_resync():
+    cache = make_switch_list_cache()
+    key = make_switch_list_cache_key('group1', version=None, is_active=None)
+    await cache.set(key, make_payload('switch1'), generation='0.0.0')
+
+    await invalidate_switch_list_cache(cache, SwitchChange.resync())
+
+    assert len(cache.local) == 0
+    assert await cache.get(key) is not None
+
+
+async def test_invalidate_switch_list_cache_evicts_shared_tier_once_per_database_restart():
+    cache = make_switch_list_cache()
+    other_worker_cache = SwitchListCache(LRUCache(max_size=10, ttl=60), shared=cache.shared, ttl=60)
+    key = make_switch_list_cache_key('group1', version=None, is_active=None)
+    await invalidate_switch_list_cache(cache, SwitchChange.resync(database_epoch=1))
+    await cache.multi_set([(key, make_payload('switch1'))], generations=await cache.get_generations([key]))
+
+    await invalidate_switch_list_cache(other_worker_cache, SwitchChange.resync(database_epoch=1))
+    assert await other_worker_cache.get(key) is not None
+
+    await invalidate_switch_list_cache(other_worker_cache, SwitchChange.resync(database_epoch=2))
+    await invalidate_switch_list_cache(cache, SwitchChange.resync(database_epoch=2))
+    assert await cache.get(key) is None
+
+
+@pytest.mark.parametrize('change,expected_remaining_keys', [
+    (
+        SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])),
+        ['missing_group:group2', 'missing_switch:2'],
+    ),
+    (SwitchChange.everything(), []),
+])
+async def test_invalidate_negative_cache_forgets_created_switches(change, expected_remaining_keys):
+    cache = LRUCache(max_size=10, ttl=60)
+    keys = [
+        make_negative_cache_key(MISSING_GROUP_NAMESPACE, 'group1'),
+        make_negative_cache_key(MISSING_GROUP_NAMESPACE, 'group2'),
+        make_negative_cache_key(MISSING_SWITCH_NAMESPACE, 1),
+        make_negative_cache_key(MISSING_SWITCH_NAMESPACE, 2),
+    ]
+    for key in keys:
+        cache.set(key, True)
+
+    await invalidate_negative_cache(cache, change)
+
+    assert [key for key in keys if cache.get(key)] == expected_remaining_keys
+
+
+async def test_single_flight_shares_one_load():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return object()
+
+    results = await asyncio.gather(*[single_flight.do('key', load) for _ in range(10)])
+
+    assert len(calls) == 1
+    assert len(set(map(id, results))) == 1
+    assert len(single_flight) == 0
+
+
+@pytest.mark.parametrize('path,validated_data,expected_result', [
+    ('/api/v1/switches_full_info', {}, 'switch_full_list:http://its-on.local:None__None'),
+    (
+        '/api/v1/switches_full_info?limit=2&after=0&utm=1',
+        {'limit': 2, 'after': 0},
+        'switch_full_list:http://its-on.local:2__None',
+    ),
+    (
+        '/api/v1/switches_full_info?limit=2&after=5',
+        {'limit': 2, 'after': 5},
+        'switch_full_list:http://its-on.local:2__5',
+    ),
+])
+def test_make_switch_full_list_cache_key(path, validated_data, expected_result):
+    request = make_mocked_request('GET', path, headers={'Host': 'ITS-ON.local'})
+    request['validated_data'] = validated_data
+
+    assert make_switch_full_list_cache_key(request) == expected_result
+
+
+async def test_single_flight_shares_errors():
+    single_flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0)
+        raise ConnectionError
+
+    results = await asyncio.gather(*[single_flight.do('key', load) for _ in range(2)], return_exceptions=True)
+
+    assert [type(result) for result in results] == [ConnectionError, ConnectionError]
+    assert len(single_flight) == 0
+
+
+async def test_single_flight_survives_cancelled_waiter():
+    single_flight = SingleFlight()
+    loaded = asyncio.Event()
+
+    async def load():
+        await loaded.wait()
+        return 'result'
+
+    first_waiter = asyncio.ensure_future(single_flight.do('key', load))
+    second_waiter = asyncio.ensure_future(single_flight.do('key', load))
+    await asyncio.sleep(0)
+    first_waiter.cancel()
+    loaded.set()
+
+    assert await second_waiter == 'result'
+    with pytest.raises(asyncio.CancelledError):
+        await first_waiter
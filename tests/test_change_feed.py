@@ -0,0 +1,119 @@
+import asyncio
+
+import aiopg
+import pytest
+
+from aiocache import Cache
+
+from its_on.cache import LRUCache, SwitchListCache, invalidate_switch_list_cache
+from its_on.change_feed import SWITCH_CHANGES_CHANNEL, SwitchChange, SwitchChangeFeed, _get_pending_redis_changes
+from its_on.config import settings
+from its_on.payloads import CachedPayload
+
+
+def test_switch_change_from_notification_payload():
+    change = SwitchChange.from_notification_payload('{"id": 1, "groups": ["group1", "group2"]}')
+
+    assert change == SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1', 'group2']))
+
+
+def test_switch_change_from_notification_payload_without_groups():
+    change = SwitchChange.from_notification_payload('{"id": 1, "groups": null}')
+
+    assert change.groups is None
+
+
+@pytest.mark.parametrize('groups,expected_groups', [
+    ("'{group3}'", frozenset(['group1', 'group3'])),
+    ("ARRAY(SELECT 'group' || n || repeat('x', 200) FROM generate_series(1, 50) AS n)", None),
+])
+async def test_switch_update_notifies_listeners(setup_tables_and_data, groups, expected_groups):
+    async with aiopg.connect(settings.DATABASE.DSN) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(f'LISTEN {SWITCH_CHANGES_CHANNEL}')
+            await cursor.execute(f"UPDATE switches SET groups = {groups} WHERE name = 'switch2'")
+        notification = await asyncio.wait_for(conn.notifies.get(), timeout=5)
+
+    change = SwitchChange.from_notification_payload(notification.payload)
+    assert change.groups == expected_groups
+
+
+def test_switch_change_merge():
+    change = SwitchChange.merge([
+        SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])),
+        SwitchChange(switch_ids=frozenset([2]), groups=frozenset(['group2'])),
+    ])
+
+    assert change == SwitchChange(switch_ids=frozenset([1, 2]), groups=frozenset(['group1', 'group2']))
+
+
+def test_switch_change_merge_with_unknown_groups():
+    change = SwitchChange.merge([
+        SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])),
+        SwitchChange.everything(),
+    ])
+
+    assert change.groups is None
+
+
+@pytest.mark.parametrize('change', [
+    SwitchChange(switch_ids=frozenset([1, 2]), groups=frozenset(['group1', 'group2'])),
+    SwitchChange.everything(),
+])
+def test_switch_change_dumps_loads_round_trip(change):
+    assert SwitchChange.loads(change.dumps()) == change
+
+
+async def test_get_pending_redis_changes_merges_burst():
+    class FakePubSub:
+        def __init__(self, messages):
+            self.messages = messages
+
+        async def get_message(self, ignore_subscribe_messages, timeout):
+            return self.messages.pop(0) if self.messages else None
+
+    pubsub = FakePubSub([
+        {'type': 'message', 'data': SwitchChange(frozenset([1]), frozenset(['group1'])).dumps().encode()},
+        {'type': 'message', 'data': SwitchChange(frozenset([2]), frozenset(['group2'])).dumps().encode()},
+    ])
+
+    change = await _get_pending_redis_changes(pubsub)
+
+    assert change == SwitchChange(switch_ids=frozenset([1, 2]), groups=frozenset(['group1', 'group2']))
+    assert pubsub.messages == []
+
+
+async def test_switch_change_feed_isolates_failing_subscribers():
+    received = []
+
+    async def failing_subscriber(change):
+        raise RuntimeError
+
+    async def subscriber(change):
+        received.append(change)
+
+    feed = SwitchChangeFeed()
+    feed.subscribe(failing_subscriber)
+    feed.subscribe(subscriber)
+
+    await feed.publish(SwitchChange.everything())
+
+    assert received == [SwitchChange.everything()]
+
+
+async def test_invalidate_switch_list_cache_evicts_only_changed_groups():
+    cache = SwitchListCache(LRUCache(max_size=10, ttl=60), shared=Cache(Cache.MEMORY), ttl=60)
+    payload = CachedPayload({'count': 0, 'result': []})
+    await cache.set('switch_list:group1:None__None', payload)
+    await cache.set('switch_list:group1:4__True', payload)
+    await cache.set('switch_list:group10:None__None', payload)
+
+    await invalidate_switch_list_cache(
+        cache, SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])),
+    )
+
+    assert cache.local.get('switch_list:group1:None__None') is None
+    assert cache.local.get('switch_list:group1:4__True') is None
+    assert cache.local.get('switch_list:group10:None__None').payload is payload
+    assert not await cache.shared.exists('switch_list:group1:None__None')
+    assert not await cache.shared.exists('switch_list:group1:4__True')
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from its_on.payloads import CachedPayload, make_payload_response
+from its_on_client import FlagSnapshot, ItsOnClient
+from its_on_client.aio import AsyncItsOnClient
+
+
+@pytest.fixture()
+async def flag_server(aiohttp_server):
+    groups = {'group1': ['switch1', 'switch2'], 'group2': ['switch3']}
+    statuses = []
+
+    async def switch_list(request):
+        names = groups[request.query['group']]
+        response = make_payload_response(request, CachedPayload({'count': len(names), 'result': names}))
+        statuses.append(response.status)
+        return response
+
+    app = web.Application()
+    app.router.add_get('/api/v1/switch', switch_list)
+    server = await aiohttp_server(app)
+    server.groups = groups
+    server.statuses = statuses
+    return server
+
+
+def test_flag_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'flags.json')
+    snapshot = FlagSnapshot({'group1': frozenset(['switch1'])}, {'group1': 'etag1'})
+
+    snapshot.dump(path)
+    loaded_snapshot = FlagSnapshot.load(path)
+
+    assert loaded_snapshot.groups == snapshot.groups
+    assert loaded_snapshot.etags == snapshot.etags
+    assert loaded_snapshot.is_active('switch1')
+    assert list(tmp_path.iterdir()) == [tmp_path / 'flags.json']
+
+
+async def test_async_client_uses_conditional_requests(flag_server, tmp_path):
+    client = AsyncItsOnClient(
+        str(flag_server.make_url('/')), groups=['group1', 'group2'], snapshot_path=str(tmp_path / 'flags.json'),
+    )
+
+    async with client:
+        assert client.is_active('switch1')
+        assert client.is_active('switch3')
+        assert not client.is_active('switch4')
+
+        flag_server.groups['group2'] = ['switch4']
+        await client.refresh()
+
+    assert client.is_active('switch4')
+    assert not client.is_active('switch3')
+    assert flag_server.statuses == [200, 200, 304, 200]
+    assert FlagSnapshot.load(str(tmp_path / 'flags.json')).is_active('switch4')
+
+
+async def test_async_client_falls_back_to_saved_snapshot(unused_tcp_port_factory, tmp_path):
+    path = str(tmp_path / 'flags.json')
+    FlagSnapshot({'group1': frozenset(['switch1']), 'group3': frozenset(['switch5'])}).dump(path)
+    client = AsyncItsOnClient(f'http://127.0.0.1:{unused_tcp_port_factory()}', groups=['group1'], snapshot_path=path)
+
+    async with client:
+        assert client.is_active('switch1')
+        assert not client.is_active('switch5')
+
+
+@pytest.fixture()
+async def broken_flag_server(aiohttp_server):
+    async def switch_list(request):
+        server.request_count += 1
+        return web.Response(body=server.body, content_type='application/json')
+
+    app = web.Application()
+    app.router.add_get('/api/v1/switch', switch_list)
+    server = await aiohttp_server(app)
+    server.body = b''
+    server.request_count = 0
+    return server
+
+
+@pytest.mark.parametrize('body', [b'<html>Bad Gateway</html>', b'{"detail": "error"}', b'[]', b'{"result": 1}'])
+async def test_async_client_keeps_snapshot_on_invalid_responses(broken_flag_server, tmp_path, body):
+    path = str(tmp_path / 'flags.json')
+    FlagSnapshot({'group1': frozenset(['switch1'])}).dump(path)
+    broken_flag_server.body = body
+    client = AsyncItsOnClient(
+        str(broken_flag_server.make_url('/')), groups=['group1'], refresh_interval=0.01, snapshot_path=path,
+    )
+
+    async with client:
+        await asyncio.sleep(0.1)
+
+        assert not client._task.done()
+        assert client.is_active('switch1')
+    assert broken_flag_server.request_count > 1
+
+
+async def test_sync_client_keeps_snapshot_on_invalid_responses(broken_flag_server, tmp_path):
+    path = str(tmp_path / 'flags.json')
+    FlagSnapshot({'group1': frozenset(['switch1'])}).dump(path)
+    broken_flag_server.body = b'{"detail": "error"}'
+    client = ItsOnClient(
+        str(broken_flag_server.make_url('/')), groups=['group1'], refresh_interval=0.01, snapshot_path=path,
+    )
+    loop = asyncio.get_running_loop()
+
+    await loop.run_in_executor(None, client.start)
+    await asyncio.sleep(0.1)
+    is_refreshing = client._thread.is_alive()
+    await loop.run_in_executor(None, client.stop)
+
+    assert is_refreshing
+    assert client.is_active('switch1')
+    assert broken_flag_server.request_count > 1
+
+
+async def test_sync_client(flag_server, tmp_path):
+    path = str(tmp_path / 'flags.json')
+    client = ItsOnClient(str(flag_server.make_url('/')), groups=['group1'], refresh_interval=60, snapshot_path=path)
+    loop = asyncio.get_running_loop()
+
+    await loop.run_in_executor(None, client.start)
+    flag_server.groups['group1'] = ['switch2']
+    await loop.run_in_executor(None, client.refresh)
+    await loop.run_in_executor(None, client.refresh)
+    await loop.run_in_executor(None, client.stop)
+
+    assert not client.is_active('switch1')
+    assert client.is_active('switch2')
+    assert flag_server.statuses == [200, 200, 304]
+    assert FlagSnapshot.load(path).groups == {'group1': frozenset(['switch2'])}
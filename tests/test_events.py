@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from its_on.events import SwitchEventBroadcaster
+from its_on.snapshot import SwitchRecord, SwitchSnapshot
+
+SWITCH = SwitchRecord(id=1, name='switch1', is_active=True, version=None, deleted_at=None, groups=('group1',))
+
+
+def make_snapshot(*records: SwitchRecord) -> SwitchSnapshot:
+    return SwitchSnapshot(records, loaded_at=0)
+
+
+def decode_data(event) -> dict:
+    data_line = event.encoded.decode().split('\n')[2]
+    return json.loads(data_line[len('data: '):])
+
+
+@pytest.fixture()
+async def broadcaster():
+    broadcaster = SwitchEventBroadcaster(buffer_size=2, queue_size=2)
+    await broadcaster.handle_snapshot_swap(None, make_snapshot(SWITCH))
+    return broadcaster
+
+
+async def toggle(broadcaster, record: SwitchRecord) -> SwitchRecord:
+    toggled = record._replace(is_active=not record.is_active)
+    await broadcaster.handle_snapshot_swap(make_snapshot(record), make_snapshot(toggled))
+    return toggled
+
+
+async def test_subscription_starts_with_current_state(broadcaster):
+    subscription = broadcaster.subscribe(['group1', 'group2'])
+
+    first_event, second_event = await subscription.get(timeout=1), await subscription.get(timeout=1)
+
+    assert decode_data(first_event)['result'] == ['switch1']
+    assert decode_data(second_event)['group'] == 'group2'
+    assert decode_data(second_event)['result'] == []
+
+
+async def test_subscription_receives_changes_of_its_groups(broadcaster):
+    subscription = broadcaster.subscribe(['group1'])
+    await subscription.get(timeout=1)
+
+    await toggle(broadcaster, SWITCH)
+
+    assert decode_data(await subscription.get(timeout=1))['count'] == 0
+
+
+async def test_resume_from_last_event_id(broadcaster):
+    subscription = broadcaster.subscribe(['group1'])
+    last_event = await subscription.get(timeout=1)
+    broadcaster.unsubscribe(subscription)
+    await toggle(broadcaster, SWITCH)
+
+    resumed_subscription = broadcaster.subscribe(['group1'], last_event_id=last_event.event_id)
+
+    missed_event = await resumed_subscription.get(timeout=1)
+    assert missed_event.sequence == last_event.sequence + 1
+
+
+@pytest.mark.parametrize('last_event_id', ['unknown-0', '', 'garbage'])
+async def test_resume_from_unknown_event_id_sends_current_state(broadcaster, last_event_id):
+    subscription = broadcaster.subscribe(['group1'], last_event_id=last_event_id)
+
+    assert decode_data(await subscription.get(timeout=1))['result'] == ['switch1']
+
+
+async def test_resume_after_buffer_overflow_sends_current_state(broadcaster):
+    subscription = broadcaster.subscribe(['group1'])
+    last_event = await subscription.get(timeout=1)
+    broadcaster.unsubscribe(subscription)
+    record = SWITCH
+    for _ in range(3):
+        record = await toggle(broadcaster, record)
+
+    resumed_subscription = broadcaster.subscribe(['group1'], last_event_id=last_event.event_id)
+
+    assert (await resumed_subscription.get(timeout=1)).sequence == 3
+
+
+async def test_slow_subscription_is_closed(broadcaster):
+    subscription = broadcaster.subscribe(['group1'])
+    record = SWITCH
+    for _ in range(3):
+        record = await toggle(broadcaster, record)
+
+    assert await subscription.get(timeout=1) is None
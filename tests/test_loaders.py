@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from its_on.cache import LRUCache
+from its_on.change_feed import SwitchChange
+from its_on.loaders import BatchLoader, invalidate_switch_loader
+
+
+def make_loader(objects, calls, ttl=60):
+    async def batch_load(object_ids):
+        calls.append(sorted(object_ids))
+        await asyncio.sleep(0)
+        return {object_id: objects[object_id] for object_id in object_ids if object_id in objects}
+
+    return BatchLoader(batch_load, cache=LRUCache(max_size=10, ttl=ttl), namespace='switch')
+
+
+async def test_batch_loader_loads_concurrent_ids_at_once():
+    calls = []
+    loader = make_loader({1: 'switch1', 2: 'switch2'}, calls)
+
+    results = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(3))
+
+    assert results == ['switch1', 'switch2', 'switch1', None]
+    assert calls == [[1, 2, 3]]
+
+
+async def test_batch_loader_caches_found_objects():
+    calls = []
+    loader = make_loader({1: 'switch1'}, calls)
+
+    await asyncio.gather(loader.load(1), loader.load(2))
+    await asyncio.gather(loader.load(1), loader.load(2))
+
+    assert calls == [[1, 2], [2]]
+
+
+async def test_batch_loader_shares_errors():
+    async def batch_load(object_ids):
+        raise ConnectionError
+
+    loader = BatchLoader(batch_load, cache=LRUCache(max_size=10, ttl=60), namespace='switch')
+
+    results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+
+    assert [type(result) for result in results] == [ConnectionError, ConnectionError]
+
+
+async def test_batch_loader_survives_cancelled_waiter():
+    calls = []
+    loader = make_loader({1: 'switch1'}, calls)
+
+    first_waiter = asyncio.ensure_future(loader.load(1))
+    second_waiter = asyncio.ensure_future(loader.load(1))
+    await asyncio.sleep(0)
+    first_waiter.cancel()
+
+    assert await second_waiter == 'switch1'
+    with pytest.raises(asyncio.CancelledError):
+        await first_waiter
+
+
+@pytest.mark.parametrize('change,expected_calls', [
+    (SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])), [[1, 2], [1]]),
+    (SwitchChange.everything(), [[1, 2], [1, 2]]),
+])
+async def test_invalidate_switch_loader(change, expected_calls):
+    calls = []
+    loader = make_loader({1: 'switch1', 2: 'switch2'}, calls)
+    await asyncio.gather(loader.load(1), loader.load(2))
+
+    await invalidate_switch_loader(loader, change)
+    await asyncio.gather(loader.load(1), loader.load(2))
+
+    assert calls == expected_calls
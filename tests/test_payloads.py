@@ -0,0 +1,217 @@
+import datetime
+import gzip
+import json
+from unittest.mock import Mock
+
+import brotli
+import msgpack
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from its_on.payloads import (
+    COMPRESSORS,
+    CachedPayload,
+    EncodedBody,
+    accepts_msgpack,
+    get_accepted_encodings,
+    is_not_modified,
+    make_cached_payload_response,
+    make_payload_response,
+    negotiate_content_coding,
+)
+
+LARGE_DATA = {'count': 100, 'result': [f'switch{number}' for number in range(100)]}
+
+
+def test_cached_payload_is_encoded_once():
+    payload = CachedPayload(LARGE_DATA)
+
+    assert json.loads(payload.body) == LARGE_DATA
+    assert gzip.decompress(payload.get_body('gzip')) == payload.body
+
+
+def test_cached_payload_etag_is_stable():
+    data = {'count': 1, 'result': ['switch1']}
+
+    assert CachedPayload(data).etag == CachedPayload(dict(data)).etag
+    assert CachedPayload(data).etag != CachedPayload({'count': 0, 'result': []}).etag
+
+
+@pytest.mark.parametrize('accept_encoding,expected_result', [
+    ('', frozenset()),
+    ('gzip, deflate, br', frozenset(['gzip', 'deflate', 'br'])),
+    ('gzip;q=0, br;q=0.5', frozenset(['br'])),
+    ('gzip;q=nonsense', frozenset()),
+])
+def test_get_accepted_encodings(accept_encoding, expected_result):
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept-Encoding': accept_encoding})
+
+    assert get_accepted_encodings(request) == expected_result
+
+
+@pytest.mark.parametrize('if_none_match,expected_result', [
+    (None, False),
+    ('"other"', False),
+    ('"{etag}"', True),
+    ('W/"{etag}"', True),
+    ('"other", "{etag}"', True),
+    ('*', True),
+])
+def test_is_not_modified(if_none_match, expected_result):
+    etag = CachedPayload({'result': []}).etag
+    headers = {'If-None-Match': if_none_match.format(etag=etag)} if if_none_match else {}
+    request = make_mocked_request('GET', '/api/v1/switch', headers=headers)
+
+    assert is_not_modified(request, etag) is expected_result
+
+
+def test_make_payload_response():
+    payload = CachedPayload(LARGE_DATA)
+    request = make_mocked_request('GET', '/api/v1/switch')
+
+    response = make_payload_response(request, payload)
+
+    assert response.status == 200
+    assert response.etag.value == payload.etag
+    assert response.body is payload.body
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_make_payload_response_gzip():
+    payload = CachedPayload(LARGE_DATA)
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept-Encoding': 'gzip'})
+
+    response = make_payload_response(request, payload)
+
+    assert response.status == 200
+    assert response.etag.value == payload.get_etag('gzip') == f'{payload.etag}-gzip'
+    assert response.body is payload.get_body('gzip')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+
+@pytest.mark.parametrize('accept_encoding', ['br', 'gzip, deflate, br', '*'])
+def test_make_payload_response_brotli(accept_encoding):
+    payload = CachedPayload(LARGE_DATA)
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept-Encoding': accept_encoding})
+
+    response = make_payload_response(request, payload)
+
+    assert response.etag.value == f'{payload.etag}-br'
+    assert brotli.decompress(response.body) == payload.body
+    assert response.headers['Content-Encoding'] == 'br'
+
+
+@pytest.mark.parametrize('accept_encoding,expected_result', [
+    ('', None),
+    ('gzip', 'gzip'),
+    ('*', 'br'),
+    ('br;q=0, *', 'gzip'),
+    ('gzip;q=0, br;q=0, *', None),
+    ('br, *;q=0', 'br'),
+    ('*;q=0', None),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('gzip;q=0.5, br;q=0.5', 'br'),
+    ('gzip;q=0.5, identity', None),
+])
+def test_negotiate_content_coding(accept_encoding, expected_result):
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept-Encoding': accept_encoding})
+
+    assert negotiate_content_coding(request, ['br', 'gzip']) == expected_result
+
+
+def test_compress_without_brotli(monkeypatch):
+    monkeypatch.delitem(COMPRESSORS, 'br', raising=False)
+    payload = CachedPayload(LARGE_DATA)
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept-Encoding': 'br, gzip'})
+
+    response = make_payload_response(request, payload)
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert payload.etags == [payload.etag, f'{payload.etag}-gzip']
+
+
+def test_compress_only_negotiated_coding(monkeypatch):
+    gzip_compress = Mock(wraps=COMPRESSORS['gzip'])
+    monkeypatch.setitem(COMPRESSORS, 'gzip', gzip_compress)
+    payload = CachedPayload(LARGE_DATA)
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept-Encoding': 'gzip'})
+
+    make_payload_response(request, payload)
+    make_payload_response(request, payload)
+
+    gzip_compress.assert_called_once_with(payload.body)
+
+
+def test_make_payload_response_svg():
+    body = EncodedBody(b'<svg xmlns="http://www.w3.org/2000/svg"></svg>' * 10)
+    request = make_mocked_request('GET', '/api/v1/switches/1/svg-badge', headers={'Accept-Encoding': 'gzip'})
+
+    response = make_payload_response(request, body, content_type='image/svg+xml', charset=None)
+
+    assert response.headers['Content-Type'] == 'image/svg+xml'
+    assert gzip.decompress(response.body) == body.body
+
+
+def test_make_payload_response_skips_compression_for_tiny_bodies():
+    payload = CachedPayload({'result': []})
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept-Encoding': 'gzip, br'})
+
+    response = make_payload_response(request, payload)
+
+    assert response.body is payload.body
+
+
+@pytest.mark.parametrize('accept_encoding', ['', 'gzip'])
+def test_make_payload_response_not_modified(accept_encoding):
+    payload = CachedPayload(LARGE_DATA)
+    request = make_mocked_request('GET', '/api/v1/switch', headers={
+        'If-None-Match': f'"{payload.etag}"',
+        'Accept-Encoding': accept_encoding,
+    })
+
+    response = make_payload_response(request, payload)
+
+    assert response.status == 304
+    assert not response.body
+
+
+@pytest.mark.parametrize('accept,expected_result', [
+    ('', False),
+    ('application/json', False),
+    ('application/msgpack', True),
+    ('application/json;q=0.9, application/x-msgpack', True),
+    ('application/msgpack;q=0', False),
+    ('application/json, application/msgpack;q=0.1', False),
+    ('application/msgpack, */*;q=0.1', True),
+    ('application/msgpack, application/json', False),
+])
+def test_accepts_msgpack(accept, expected_result):
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept': accept})
+
+    assert accepts_msgpack(request) is expected_result
+
+
+def test_make_cached_payload_response_msgpack():
+    created_at = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    payload = CachedPayload({'result': [{'name': 'switch1', 'created_at': created_at}]}, dumps=str)
+    request = make_mocked_request('GET', '/api/v1/switches_full_info', headers={'Accept': 'application/msgpack'})
+
+    response = make_cached_payload_response(request, payload)
+
+    assert response.headers['Content-Type'] == 'application/msgpack'
+    assert response.headers['Vary'] == 'Accept, Accept-Encoding'
+    assert response.etag.value == payload.msgpack_body.etag != payload.etag
+    assert msgpack.unpackb(response.body, timestamp=3) == {'result': [{'name': 'switch1', 'created_at': created_at}]}
+    assert payload.msgpack_body is payload.msgpack_body
+
+
+def test_make_cached_payload_response_json():
+    payload = CachedPayload(LARGE_DATA)
+    request = make_mocked_request('GET', '/api/v1/switch', headers={'Accept': '*/*'})
+
+    response = make_cached_payload_response(request, payload)
+
+    assert response.headers['Content-Type'] == 'application/json; charset=utf-8'
+    assert response.body is payload.body
+    assert response.headers['Vary'] == 'Accept, Accept-Encoding'
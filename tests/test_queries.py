@@ -0,0 +1,92 @@
+import re
+from typing import Generator, List
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from its_on.config import settings
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+from aiocache import SimpleMemoryCache
+
+from its_on.app_keys import negative_cache_key, switch_list_cache_key
+from its_on.cache import LRUCache, SwitchListCache
+from its_on.snapshot import GroupSwitches, SwitchRecord
+from its_on.views import SwitchBatchListView, SwitchListView
+from .helpers import get_engine
+
+
+@pytest.fixture()
+def explain(setup_tables_and_data) -> Generator:
+    with get_engine(settings.DATABASE.DSN).connect() as conn:
+        # Test tables are tiny: leave the planner no cheaper option than a scan with an index condition.
+        conn.exec_driver_sql('SET enable_seqscan = off')
+        conn.exec_driver_sql('SET enable_indexscan = off')
+        yield lambda queryset: _explain(conn, queryset)
+
+
+def _explain(conn: Connection, queryset: Select) -> List[str]:
+    """Names of the indexes in the query plan."""
+    compiled = queryset.compile(dialect=postgresql.dialect())
+    rows = conn.exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+    return re.findall(r'Index Scan on (\w+)', '\n'.join(row[0] for row in rows))
+
+
+def make_view(view_class, validated_data, app=None):
+    request = make_mocked_request('GET', '/', app=app)
+    request['validated_data'] = validated_data
+    return view_class(request)
+
+
+async def test_switch_list_query_uses_groups_index(explain):
+    queryset = make_view(SwitchListView, {'group': 'group1'}).get_queryset(['group1'])
+
+    assert explain(queryset) == ['idx_switches_groups']
+
+
+async def test_switch_batch_query_uses_groups_index(explain):
+    queryset = make_view(SwitchBatchListView, {'group': ['group1', 'group2']}).get_queryset(['group1', 'group2'])
+
+    assert explain(queryset) == ['idx_switches_groups']
+
+
+RECORD = SwitchRecord(id=1, name='switch1', is_active=True, version=3, deleted_at=None, groups=('group1', 'group2'))
+
+
+@pytest.fixture()
+def app_without_snapshot():
+    app = web.Application()
+    app[negative_cache_key] = LRUCache(max_size=10, ttl=60)
+    app[switch_list_cache_key] = SwitchListCache(LRUCache(max_size=10, ttl=60), shared=SimpleMemoryCache(), ttl=60)
+    return app
+
+
+async def test_switch_batch_cache_keys_look_groups_up_once(mocker, app_without_snapshot):
+    load_group_switches = mocker.patch.object(
+        SwitchBatchListView,
+        'load_group_switches',
+        return_value={'group1': GroupSwitches([RECORD]), 'group2': GroupSwitches([RECORD])},
+    )
+    view = make_view(SwitchBatchListView, {'group': ['group1', 'group2'], 'version': 10}, app=app_without_snapshot)
+
+    cache_keys = await view.make_cache_keys(['group1', 'group2'])
+
+    load_group_switches.assert_called_once_with(['group1', 'group2'])
+    assert cache_keys == {'group1': 'switch_list:group1:3__None', 'group2': 'switch_list:group2:3__None'}
+
+
+async def test_switch_batch_does_not_cache_unknown_groups(mocker, app_without_snapshot):
+    mocker.patch.object(
+        SwitchBatchListView,
+        'load_group_switches',
+        return_value={'group1': GroupSwitches([RECORD]), 'bogus': GroupSwitches()},
+    )
+    view = make_view(SwitchBatchListView, {'group': ['group1', 'bogus']}, app=app_without_snapshot)
+
+    data = await view.get_batch_response_data()
+
+    assert data == {'result': {'group1': {'count': 1, 'result': ['switch1']}, 'bogus': {'count': 0, 'result': []}}}
+    assert view.is_missing_group('bogus')
+    assert len(app_without_snapshot[switch_list_cache_key].local) == 1
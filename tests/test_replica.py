@@ -0,0 +1,138 @@
+import datetime
+import hashlib
+
+import pytest
+from aiohttp import web
+
+from its_on.app_keys import cache_key, replica_key, switch_list_cache_key
+from its_on.config import settings
+from its_on.main import init_replica_app
+from its_on.replica import ReplicaSnapshot, parse_switch_record
+
+
+def make_switch_data(switch_id, name, groups, is_active=True, deleted_at=None):
+    return {
+        'id': switch_id,
+        'name': name,
+        'is_active': is_active,
+        'groups': groups,
+        'version': None,
+        'deleted_at': deleted_at,
+    }
+
+
+@pytest.fixture()
+async def upstream(aiohttp_server):
+    switches_data = [
+        make_switch_data(1, 'switch1', ['group1', 'group2']),
+        make_switch_data(2, 'switch2', ['group1'], is_active=False),
+        make_switch_data(3, 'switch3', ['group1'], deleted_at='2020-01-01T00:00:00+00:00'),
+    ]
+
+    async def full_info(request):
+        response = web.json_response({'result': switches_data, 'next': None})
+        etag = hashlib.md5(response.body).hexdigest()
+        if any(candidate.value == etag for candidate in request.if_none_match or ()):
+            server.not_modified_count += 1
+            raise web.HTTPNotModified()
+        response.etag = etag
+        return response
+
+    app = web.Application()
+    app.router.add_get('/api/v1/switches_full_info', full_info)
+    server = await aiohttp_server(app)
+    server.switches_data = switches_data
+    server.not_modified_count = 0
+    return server
+
+
+@pytest.fixture()
+async def replica_client(aiohttp_client, upstream):
+    settings.set('REPLICA__UPSTREAM_URL', str(upstream.make_url('/')))
+    yield await aiohttp_client(await init_replica_app())
+    settings.set('REPLICA__UPSTREAM_URL', '@none')
+
+
+def test_parse_switch_record():
+    record = parse_switch_record(make_switch_data(3, 'switch3', None, deleted_at='2020-01-01T00:00:00+00:00'))
+
+    assert record.deleted_at == datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    assert record.groups == ()
+
+
+def test_replica_snapshot_change():
+    previous = ReplicaSnapshot([parse_switch_record(make_switch_data(1, 'switch1', ['group1']))], loaded_at=0)
+    snapshot = ReplicaSnapshot([parse_switch_record(make_switch_data(1, 'switch1', ['group2']))], loaded_at=1)
+
+    change = snapshot.get_change(previous)
+
+    assert change.switch_ids == frozenset([1])
+    assert change.groups == frozenset(['group1', 'group2'])
+    assert not snapshot.get_change(snapshot).switch_ids
+
+
+async def test_replica_serves_switch_list(replica_client):
+    response = await replica_client.get('/api/v1/switch', params={'group': 'group1'})
+
+    assert response.status == 200
+    assert await response.json() == {'count': 1, 'result': ['switch1']}
+
+
+async def test_replica_follows_upstream(replica_client, upstream):
+    await replica_client.get('/api/v1/switch', params={'group': 'group1'})
+    upstream.switches_data.append(make_switch_data(4, 'switch4', ['group1']))
+    await replica_client.app[replica_key].refresh()
+
+    response = await replica_client.get('/api/v1/switch', params={'group': 'group1'})
+
+    assert await response.json() == {'count': 2, 'result': ['switch1', 'switch4']}
+
+
+async def test_replica_keeps_snapshot_of_unchanged_upstream(replica_client, upstream):
+    engine = replica_client.app[replica_key]
+    snapshot = await engine.get_snapshot()
+
+    assert await engine.refresh() is snapshot
+    assert upstream.not_modified_count
+
+
+async def test_replica_is_not_synced_with_unparsable_upstream(replica_client, upstream):
+    engine = replica_client.app[replica_key]
+    engine.synced_at = None
+    upstream.switches_data.append({'id': 4})
+
+    with pytest.raises(KeyError):
+        await engine.refresh()
+
+    assert engine.replication_lag is None
+
+
+async def test_replica_caches_switch_lists_in_memory_only(replica_client):
+    assert cache_key not in replica_client.app
+    assert replica_client.app[switch_list_cache_key].shared is None
+
+
+async def test_replica_serves_badges_of_deleted_switches(replica_client):
+    response = await replica_client.get('/api/v1/switches/3/svg-badge')
+
+    assert response.status == 200
+    assert 'switch3 (deleted)' in await response.text()
+
+
+async def test_replica_has_no_admin(replica_client):
+    response = await replica_client.get('/zbs/switches')
+
+    assert response.status == 404
+
+
+async def test_replica_metrics(replica_client):
+    await replica_client.get('/api/v1/switch', params={'group': 'group1'})
+
+    response = await replica_client.get('/metrics')
+    readiness_response = await replica_client.get('/readyz')
+
+    text = await response.text()
+    assert 'its_on_replication_lag_seconds ' in text
+    assert 'its_on_cache_misses_total{cache="switch_list",tier="local"} ' in text
+    assert 'tier="shared"' not in text
+    assert readiness_response.status == 200
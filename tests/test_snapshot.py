@@ -0,0 +1,153 @@
+import asyncio
+import datetime
+
+import pytest
+
+from its_on.cache import LRUCache
+from its_on.change_feed import SwitchChange
+from its_on.snapshot import (
+    GroupSwitches,
+    SwitchRecord,
+    SwitchSnapshot,
+    SwitchSnapshotEngine,
+    invalidate_group_switches_cache,
+    make_group_switches_cache_key,
+)
+
+NOW = datetime.datetime(2020, 5, 1, tzinfo=datetime.timezone.utc)
+
+
+def make_record(**kwargs) -> SwitchRecord:
+    params = {
+        'id': 1,
+        'name': 'switch',
+        'is_active': True,
+        'version': None,
+        'deleted_at': None,
+        'groups': ('group1',),
+        **kwargs,
+    }
+    return SwitchRecord(**params)
+
+
+@pytest.fixture()
+def snapshot():
+    return SwitchSnapshot(
+        [
+            make_record(id=1, name='switch4', version=4, groups=('group1', 'group3')),
+            make_record(id=2, name='switch1', groups=('group1', 'group2')),
+            make_record(id=3, name='switch3', is_active=False, version=4),
+            make_record(id=4, name='switch2', deleted_at=NOW + datetime.timedelta(days=1)),
+            make_record(id=5, name='switch5', deleted_at=NOW - datetime.timedelta(days=1)),
+            make_record(id=6, name='switch6', groups=()),
+        ],
+        loaded_at=0,
+    )
+
+
+@pytest.mark.parametrize('filter_params,expected_names', [
+    ({}, ['switch1', 'switch2', 'switch4']),
+    ({'is_active': False}, ['switch3']),
+    ({'version': 1}, []),
+    ({'version': 4}, ['switch4']),
+    ({'version': 100}, ['switch4']),
+])
+def test_snapshot_group_filter(snapshot, filter_params, expected_names):
+    records = snapshot.get_group('group1').filter(now=NOW, **filter_params)
+
+    assert [record.name for record in records] == expected_names
+
+
+def test_group_switches_sort_names_case_insensitively():
+    names = ['switch_b', 'Switch_a', 'switch_A', 'switch_a', 'SWITCH_C']
+
+    group = GroupSwitches(make_record(id=number, name=name) for number, name in enumerate(names))
+
+    assert [record.name for record in group.records] == ['switch_a', 'switch_A', 'Switch_a', 'switch_b', 'SWITCH_C']
+
+
+@pytest.mark.parametrize('version,expected_bucket', [
+    (None, None),
+    (1, 1),
+    (2, 1),
+    (4, 4),
+    (10, 7),
+    (0, 0),
+    (-5, 0),
+])
+def test_group_switches_version_bucket_selects_same_switches(version, expected_bucket):
+    group = GroupSwitches([
+        make_record(id=1, name='switch1', version=7),
+        make_record(id=2, name='switch2', version=1),
+        make_record(id=3, name='switch3', version=4),
+        make_record(id=4, name='switch4', version=4, is_active=False),
+        make_record(id=5, name='switch5'),
+    ])
+
+    bucket = group.get_version_bucket(version)
+
+    assert group.version_thresholds == (1, 4, 7)
+    assert bucket == expected_bucket
+    assert group.filter(version=bucket, now=NOW) == group.filter(version=version, now=NOW)
+
+
+def test_snapshot_hides_deleted_switches_at_read_time(snapshot):
+    later = NOW + datetime.timedelta(days=2)
+
+    records = snapshot.get_group('group1').filter(now=later)
+
+    assert [record.name for record in records] == ['switch1', 'switch4']
+
+
+def test_snapshot_unknown_group(snapshot):
+    assert snapshot.get_group('unknown').filter(now=NOW) == []
+
+
+async def test_snapshot_engine_reloads_on_every_read_without_refresh_interval(mocker):
+    engine = SwitchSnapshotEngine(refresh_interval=0)
+    load_records = mocker.patch.object(engine, '_load_records', return_value=[make_record()])
+
+    first, second = await engine.get_snapshot(), await engine.get_snapshot()
+
+    assert load_records.call_count == 2
+    assert first is not second
+    assert [record.name for record in second.get_group('group1').records] == ['switch']
+
+
+async def test_snapshot_engine_shares_concurrent_refreshes(mocker):
+    engine = SwitchSnapshotEngine(refresh_interval=0)
+
+    async def load_records():
+        await asyncio.sleep(0)
+        return [make_record()]
+
+    load_records_mock = mocker.patch.object(engine, '_load_records', side_effect=load_records)
+
+    snapshots = await asyncio.gather(*(engine.refresh() for _ in range(5)))
+
+    assert load_records_mock.call_count == 2
+    assert snapshots[-1] is snapshots[1]
+
+
+def test_snapshot_changed_groups(snapshot):
+    changed_snapshot = SwitchSnapshot(
+        [
+            make_record(id=1, name='switch4', version=5, groups=('group1', 'group3')),
+            make_record(id=2, name='switch1', groups=('group1', 'group2')),
+        ],
+        loaded_at=1,
+    )
+
+    assert changed_snapshot.get_changed_groups(snapshot) == {'group1', 'group3'}
+    assert snapshot.get_changed_groups(None) == {'group1', 'group2', 'group3'}
+
+
+async def test_invalidate_group_switches_cache_evicts_only_changed_groups():
+    cache = LRUCache(max_size=10, ttl=60)
+    for group_name in ['group1', 'group2']:
+        cache.set(make_group_switches_cache_key(group_name), GroupSwitches())
+
+    await invalidate_group_switches_cache(cache, SwitchChange(switch_ids=frozenset([1]), groups=frozenset(['group1'])))
+
+    assert cache.get(make_group_switches_cache_key('group1')) is None
+    assert cache.get(make_group_switches_cache_key('group2')) is not None
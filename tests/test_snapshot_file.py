@@ -0,0 +1,91 @@
+import datetime
+import os
+
+import pytest
+
+from its_on.snapshot import SwitchRecord, SwitchSnapshot
+from its_on.snapshot_file import export_snapshot_file
+from its_on_client.mmap_snapshot import MappedSnapshot, SnapshotFileReader, SwitchState
+
+TOMORROW = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+YESTERDAY = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+
+
+def make_snapshot(*records):
+    return SwitchSnapshot(
+        [
+            SwitchRecord(number, name, is_active, version, deleted_at, groups)
+            for number, (name, is_active, version, deleted_at, groups) in enumerate(records)
+        ],
+        loaded_at=0,
+    )
+
+
+@pytest.fixture()
+async def snapshot_path(tmp_path):
+    path = str(tmp_path / 'switches.snapshot')
+    snapshot = make_snapshot(
+        ('switch1', True, None, None, ('group1', 'group2')),
+        ('switch2', True, 4, None, ('group1',)),
+        ('switch3', False, None, None, ('group1',)),
+        ('switch4', True, None, TOMORROW, ('group1',)),
+        ('switch5', True, None, YESTERDAY, ('group1',)),
+    )
+    await export_snapshot_file(path, None, snapshot)
+    return path
+
+
+@pytest.mark.parametrize('group_name,name,version,expected_result', [
+    ('group1', 'switch1', None, True),
+    ('group2', 'switch1', None, True),
+    ('group3', 'switch1', None, False),
+    ('group1', 'switch2', None, True),
+    ('group1', 'switch2', 4, True),
+    ('group1', 'switch2', 3, False),
+    ('group1', 'switch1', 3, False),
+    ('group1', 'switch3', None, False),
+    ('group1', 'switch4', None, True),
+    ('group1', 'switch5', None, False),
+    ('group1', 'unknown', None, False),
+])
+def test_snapshot_file_reader_is_active(snapshot_path, group_name, name, version, expected_result):
+    reader = SnapshotFileReader(snapshot_path)
+
+    assert reader.is_active(group_name, name, version=version) is expected_result
+
+
+def test_mapped_snapshot_lookup(snapshot_path):
+    snapshot = MappedSnapshot(snapshot_path)
+
+    assert snapshot.count == 6
+    assert snapshot.lookup('group1', 'switch2') == SwitchState(is_active=True, version=4, deleted_at=None)
+    assert snapshot.lookup('group1', 'switch4').deleted_at == TOMORROW.timestamp()
+    assert snapshot.lookup('group2', 'switch2') is None
+
+
+def test_mapped_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(b'x' * 32)
+
+    with pytest.raises(ValueError):
+        MappedSnapshot(str(path))
+
+
+async def test_snapshot_file_reader_follows_replacements(snapshot_path):
+    reader = SnapshotFileReader(snapshot_path, check_interval=0)
+    previous_snapshot = make_snapshot(('switch1', True, None, None, ('group1', 'group2')))
+    snapshot = make_snapshot(('switch1', False, None, None, ('group1',)))
+
+    await export_snapshot_file(snapshot_path, previous_snapshot, snapshot)
+
+    assert not reader.is_active('group1', 'switch1')
+    assert os.listdir(os.path.dirname(snapshot_path)) == ['switches.snapshot']
+
+
+async def test_export_snapshot_file_skips_unchanged_snapshots(snapshot_path):
+    stat = os.stat(snapshot_path)
+    snapshot = make_snapshot(('switch1', True, None, None, ('group1',)))
+
+    await export_snapshot_file(snapshot_path, snapshot, make_snapshot(('switch1', True, None, None, ('group1',))))
+
+    assert os.stat(snapshot_path).st_mtime_ns == stat.st_mtime_ns
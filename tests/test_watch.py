@@ -0,0 +1,52 @@
+import asyncio
+
+from its_on.snapshot import SwitchRecord, SwitchSnapshot
+from its_on.watch import SwitchWatchHub
+
+
+def make_snapshot(*records: SwitchRecord) -> SwitchSnapshot:
+    return SwitchSnapshot(records, loaded_at=0)
+
+
+SWITCH = SwitchRecord(id=1, name='switch1', is_active=True, version=None, deleted_at=None, groups=('group1',))
+
+
+async def test_watch_hub_returns_none_on_timeout():
+    hub = SwitchWatchHub()
+    snapshot = make_snapshot(SWITCH)
+    await hub.handle_snapshot_swap(None, snapshot)
+
+    changed_snapshot = await hub.wait_for_change('group1', snapshot.get_group('group1').revision, timeout=0.01)
+
+    assert changed_snapshot is None
+
+
+async def test_watch_hub_wakes_up_waiters_of_changed_group():
+    hub = SwitchWatchHub()
+    snapshot = make_snapshot(SWITCH)
+    await hub.handle_snapshot_swap(None, snapshot)
+    revision = snapshot.get_group('group1').revision
+    waiters = [
+        asyncio.create_task(hub.wait_for_change('group1', revision, timeout=1))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+
+    new_snapshot = make_snapshot(SWITCH._replace(is_active=False))
+    await hub.handle_snapshot_swap(snapshot, new_snapshot)
+
+    assert await asyncio.gather(*waiters) == [new_snapshot] * 3
+
+
+async def test_watch_hub_ignores_changes_of_other_groups():
+    hub = SwitchWatchHub()
+    snapshot = make_snapshot(SWITCH)
+    await hub.handle_snapshot_swap(None, snapshot)
+    waiter = asyncio.create_task(
+        hub.wait_for_change('group1', snapshot.get_group('group1').revision, timeout=0.05),
+    )
+    await asyncio.sleep(0)
+
+    await hub.handle_snapshot_swap(snapshot, make_snapshot(SWITCH, SWITCH._replace(id=2, groups=('group2',))))
+
+    assert await waiter is None